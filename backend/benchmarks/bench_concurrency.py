@@ -0,0 +1,74 @@
+"""并发吞吐量基准测试
+
+对比两种路由写法在并发请求下的吞吐量：
+- blocking: async def 路由中直接执行同步数据库查询（改造前），查询会阻塞事件循环
+- threadpool: def 路由，由 FastAPI 放入线程池执行（改造后）
+
+默认用 time.sleep 模拟一次数据库往返，不需要 MySQL：
+
+    python benchmarks/bench_concurrency.py --requests 500 --concurrency 50 --latency 0.01
+
+也可以对运行中的服务压测，分别在改造前后的代码上运行以对比：
+
+    python benchmarks/bench_concurrency.py --url http://localhost:8080/api/posts
+"""
+import time
+import asyncio
+import argparse
+import httpx
+from fastapi import FastAPI
+
+
+def build_apps(latency: float):
+    blocking_app = FastAPI()
+    threadpool_app = FastAPI()
+
+    @blocking_app.get("/query")
+    async def blocking_query():
+        time.sleep(latency)
+        return {"ok": True}
+
+    @threadpool_app.get("/query")
+    def threadpool_query():
+        time.sleep(latency)
+        return {"ok": True}
+
+    return {"blocking": blocking_app, "threadpool": threadpool_app}
+
+
+async def run(client: httpx.AsyncClient, url: str, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            response = await client.get(url)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return total / (time.perf_counter() - start)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="并发吞吐量基准测试")
+    parser.add_argument("--requests", type=int, default=500, help="请求总数")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发数")
+    parser.add_argument("--latency", type=float, default=0.01, help="模拟的数据库往返耗时（秒）")
+    parser.add_argument("--url", help="压测运行中的服务，而不是内置的模拟路由")
+    args = parser.parse_args()
+
+    if args.url:
+        async with httpx.AsyncClient(timeout=60) as client:
+            rps = await run(client, args.url, args.requests, args.concurrency)
+        print(f"{args.url}: {rps:.1f} req/s")
+        return
+
+    for name, app in build_apps(args.latency).items():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            rps = await run(client, "/query", args.requests, args.concurrency)
+        print(f"{name:>10}: {rps:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
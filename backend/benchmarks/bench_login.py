@@ -0,0 +1,106 @@
+"""登录（bcrypt 校验）吞吐量基准测试
+
+本地模式对比两种执行方式，同时统计登录高峰期间普通请求的延迟：
+- inline: 在请求线程池中直接执行 bcrypt（改造前）
+- hasher: 交给 PasswordHasher 的进程池执行（改造后）
+
+    python benchmarks/bench_login.py --logins 200 --threads 40 --max-pending 40
+
+吞吐量只统计校验成功的登录，被 PasswordHasher 拒绝（接口返回 503）的请求单独列出。
+--max-pending 小于 --threads 时 hasher 会拒绝部分请求，两种方式的吞吐量不可直接比较。
+
+也可以对运行中的服务压测登录接口：
+
+    python benchmarks/bench_login.py --url http://localhost:8080/api/login --username test --password password
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from password_hasher import PasswordHasher, PasswordHasherBusy, pwd_context
+
+
+def run_local(name, verify, logins: int, threads: int):
+    hashed = pwd_context.hash("password")
+    latencies = []
+    pool = ThreadPoolExecutor(threads)
+
+    def page_request():
+        # 模拟一个普通请求：在同一个请求线程池中排队执行的轻量任务
+        start = time.perf_counter()
+        pool.submit(lambda: None).result()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    futures = [pool.submit(verify, "password", hashed) for _ in range(logins)]
+    probe = ThreadPoolExecutor(1)
+    while not all(f.done() for f in futures):
+        probe.submit(page_request).result()
+        time.sleep(0.01)
+    # verify 返回 None 表示被拒绝（对应接口的 503），不计入吞吐量
+    results = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    pool.shutdown()
+    probe.shutdown()
+    ok = sum(1 for result in results if result is not None)
+    rejected = len(results) - ok
+    p95 = statistics.quantiles(latencies, n=20)[-1] * 1000 if len(latencies) >= 2 else 0.0
+    print(f"{name:>7}: {ok / elapsed:7.1f} logins/s (成功 {ok}, 拒绝 {rejected}), 普通请求 p95 延迟 {p95:8.1f} ms")
+
+
+async def run_remote(url, username, password, logins, concurrency):
+    import httpx
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(timeout=60) as client:
+        async def one():
+            async with semaphore:
+                response = await client.post(url, json={"username": username, "password": password})
+                return response.status_code
+
+        start = time.perf_counter()
+        codes = await asyncio.gather(*(one() for _ in range(logins)))
+        elapsed = time.perf_counter() - start
+    ok = sum(1 for code in codes if code == 200)
+    busy = sum(1 for code in codes if code == 503)
+    print(f"{url}: {ok / elapsed:.1f} logins/s, 成功 {ok}, 503 {busy}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="登录吞吐量基准测试")
+    parser.add_argument("--logins", type=int, default=200, help="登录请求数")
+    parser.add_argument("--threads", type=int, default=40, help="请求线程池大小（对应 THREADPOOL_SIZE）")
+    parser.add_argument("--workers", type=int, default=2, help="PasswordHasher 进程数")
+    parser.add_argument("--max-pending", type=int, default=16, help="PasswordHasher 最大排队数，超出的请求返回 503；不小于 --threads 时不会拒绝")
+    parser.add_argument("--url", help="压测运行中服务的登录接口")
+    parser.add_argument("--username", default="test")
+    parser.add_argument("--password", default="password")
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(run_remote(args.url, args.username, args.password, args.logins, args.threads))
+        return
+
+    run_local("inline", pwd_context.verify, args.logins, args.threads)
+    hasher = PasswordHasher(args.workers, args.max_pending)
+
+    def verify(plain_password, hashed_password):
+        try:
+            return hasher.verify(plain_password, hashed_password)
+        except PasswordHasherBusy:
+            return None
+
+    try:
+        run_local("hasher", verify, args.logins, args.threads)
+    finally:
+        hasher.shutdown()
+    print(hasher.stats())
+
+
+if __name__ == "__main__":
+    main()
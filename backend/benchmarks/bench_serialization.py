@@ -0,0 +1,131 @@
+"""列表接口序列化基准测试
+
+对比两种响应方式返回同一批文章时每个请求的耗时：
+- model: 返回 dict 列表，由 FastAPI 按 response_model=List[Post] 校验，再经 jsonable_encoder 和 json 编码（改造前）
+- fast: 返回 FastJSONResponse，数据已经是 API 格式，直接用 orjson 编码（改造后，FAST_JSON_ROUTES）
+
+同时单独统计不经过 HTTP 的纯序列化耗时。数据为内存中生成的文章，不需要 MySQL：
+
+    python benchmarks/bench_serialization.py --posts 100 --requests 300
+
+未安装 orjson 时 fast 使用标准库 json，只省去校验和 jsonable_encoder 的开销。
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import Dict, List, Optional
+import httpx
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, parse_obj_as
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import fast_json
+from fast_json import FastJSONResponse
+
+
+# 与 main.Post 字段相同，避免导入 main 时初始化数据库和缓存文件
+class Post(BaseModel):
+    id: str
+    title: str
+    content: str
+    description: Optional[str] = None
+    category: str
+    tags: List[str] = []
+    status: str = "draft"
+    author: str
+    views: int = 0
+    publishDate: Optional[str] = None
+    updateTime: str
+    coverImage: Optional[str] = None
+    coverImageVariants: Optional[Dict[str, Dict[str, str]]] = None
+    commentCount: int = 0
+    likeCount: int = 0
+
+
+def make_posts(count: int, content_size: int):
+    return [
+        {
+            "id": f"00000000-0000-0000-0000-{i:012d}",
+            "title": f"文章标题 {i}",
+            "content": ("Markdown 正文内容，" * (content_size // 12 + 1))[:content_size],
+            "description": f"文章 {i} 的摘要",
+            "category": "技术",
+            "tags": ["python", "fastapi", "性能"],
+            "status": "published",
+            "author": "admin",
+            "views": i * 7,
+            "publishDate": "2024-01-01T12:00:00",
+            "updateTime": "2024-01-02T08:30:00",
+            "coverImage": f"/uploads/{i:064x}.jpg",
+            "coverImageVariants": {
+                "thumbnail": {"original": f"/uploads/variants/{i:064x}.jpg.thumbnail.jpg", "webp": f"/uploads/variants/{i:064x}.jpg.thumbnail.webp"}
+            },
+            "commentCount": i % 13,
+            "likeCount": i % 29
+        }
+        for i in range(count)
+    ]
+
+
+def build_apps(posts):
+    model_app = FastAPI()
+    fast_app = FastAPI()
+
+    @model_app.get("/posts", response_model=List[Post])
+    def model_posts():
+        return posts
+
+    @fast_app.get("/posts", response_model=List[Post])
+    def fast_posts():
+        return FastJSONResponse(content=posts)
+
+    return {"model": model_app, "fast": fast_app}
+
+
+def bench_encode(posts, rounds: int):
+    def model_path():
+        validated = parse_obj_as(List[Post], posts)
+        return json.dumps(jsonable_encoder(validated), ensure_ascii=False).encode("utf-8")
+
+    for name, encode in (("model", model_path), ("fast", lambda: fast_json.dumps(posts))):
+        encode()
+        start = time.perf_counter()
+        for _ in range(rounds):
+            encode()
+        elapsed = (time.perf_counter() - start) / rounds
+        print(f"{name:>6}: {elapsed * 1000:8.3f} ms/次 (仅序列化)")
+
+
+async def bench_http(apps, total: int):
+    for name, app in apps.items():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+            (await client.get("/posts")).raise_for_status()
+            start = time.perf_counter()
+            for _ in range(total):
+                response = await client.get("/posts")
+                response.raise_for_status()
+            elapsed = (time.perf_counter() - start) / total
+        print(f"{name:>6}: {elapsed * 1000:8.3f} ms/请求, 响应 {len(response.content)} 字节")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列表接口序列化基准测试")
+    parser.add_argument("--posts", type=int, default=100, help="每个响应包含的文章数")
+    parser.add_argument("--content-size", type=int, default=2000, help="每篇文章正文的字符数")
+    parser.add_argument("--requests", type=int, default=300, help="每种方式的请求数")
+    args = parser.parse_args()
+
+    posts = make_posts(args.posts, args.content_size)
+    print(f"编码器: {'orjson' if fast_json.orjson is not None else 'json (未安装 orjson)'}")
+    bench_encode(posts, args.requests)
+    asyncio.run(bench_http(build_apps(posts), args.requests))
+
+
+if __name__ == "__main__":
+    main()
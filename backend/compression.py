@@ -0,0 +1,243 @@
+import zlib
+import threading
+from collections import OrderedDict
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli 时只使用 gzip
+    brotli = None
+
+# 按优先级排列
+ENCODINGS = ("br", "gzip")
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml"
+)
+# 这些状态码没有响应体，或响应体是部分内容
+SKIP_STATUS = (204, 206, 304)
+
+
+def accepted_encodings(header: str):
+    """解析 Accept-Encoding，返回 q 值大于 0 的编码"""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.partition(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if q > 0:
+            accepted.add(name)
+    return accepted
+
+
+class StreamCompressor:
+    """流式压缩，每个分块都会 flush，客户端可以立即解压已收到的内容"""
+
+    def __init__(self, encoding: str, gzip_level: int, brotli_quality: int):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._compressor = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes):
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+class CompressedBodyCache:
+    """按 (路径, 查询参数, ETag, 编码) 缓存压缩后的响应体，按总字节数做 LRU 淘汰
+
+    只缓存带强 ETag 的响应：ETag 是响应内容的哈希，内容不变时可以直接复用压缩结果。
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            body = self._entries.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def set(self, key, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._entries[key] = body
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "maxBytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": self.hits / total if total else 0.0
+            }
+
+
+class CompressionMiddleware:
+    """按 Accept-Encoding 使用 brotli 或 gzip 压缩响应
+
+    - 小于 minimum_size 的响应不压缩
+    - 已经设置 Content-Encoding 的响应（如 /uploads 的预压缩文件）、Range 请求和 HEAD 请求不处理
+    - 分多次发送的响应（StreamingResponse、FileResponse）边收边压缩
+    - 带强 ETag 的响应，压缩结果缓存在 CompressedBodyCache 中，压缩后的响应改为弱 ETag
+    """
+
+    def __init__(self, app, minimum_size: int = 500, gzip_level: int = 6, brotli_quality: int = 4, cache: CompressedBodyCache = None):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.cache = cache if cache is not None else CompressedBodyCache(32 * 1024 * 1024)
+
+    def select_encoding(self, headers: Headers):
+        accepted = accepted_encodings(headers.get("accept-encoding", ""))
+        for encoding in ENCODINGS:
+            if encoding in accepted and (encoding != "br" or brotli is not None):
+                return encoding
+        return None
+
+    def compress(self, body: bytes, encoding: str):
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)
+        return compressor.compress(body) + compressor.flush()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] == "HEAD":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        encoding = self.select_encoding(headers)
+        if encoding is None or "range" in headers:
+            await self.app(scope, receive, send)
+            return
+        responder = _CompressionResponder(self, scope, encoding, send)
+        await self.app(scope, receive, responder.send)
+
+
+class _CompressionResponder:
+    def __init__(self, middleware: CompressionMiddleware, scope, encoding: str, send):
+        self.middleware = middleware
+        self.scope = scope
+        self.encoding = encoding
+        self._send = send
+        self.start_message = None
+        self.started = False
+        self.passthrough = False
+        self.compressor = None
+
+    def should_compress(self, headers: MutableHeaders, body: bytes, more_body: bool):
+        if self.start_message["status"] < 200 or self.start_message["status"] in SKIP_STATUS:
+            return False
+        if "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return False
+        if more_body:
+            content_length = headers.get("content-length")
+            return not (content_length and content_length.isdigit() and int(content_length) < self.middleware.minimum_size)
+        return len(body) >= self.middleware.minimum_size
+
+    def cache_key(self, etag):
+        """按原始响应的强 ETag 和编码缓存，需要在 ETag 被改为弱 ETag 之前取得"""
+        if not etag or etag.startswith("W/"):
+            return None
+        return self.scope["path"], self.scope.get("query_string", b""), etag, self.encoding
+
+    async def send(self, message):
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.started:
+            await self.send_body(message)
+            return
+
+        # 第一个响应体分块：决定是否压缩
+        self.started = True
+        headers = MutableHeaders(raw=self.start_message["headers"])
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        if not self.should_compress(headers, body, more_body):
+            self.passthrough = True
+            await self._send(self.start_message)
+            await self._send(message)
+            return
+
+        etag = headers.get("etag")
+        headers["Content-Encoding"] = self.encoding
+        headers.add_vary_header("Accept-Encoding")
+        if etag and not etag.startswith("W/"):
+            # 压缩后的字节与原始响应不同，不能共用强 ETag（会误导 If-Range 和共享缓存）。
+            # 改为弱 ETag：接口的 If-None-Match 比较忽略 W/ 前缀，304 不受影响
+            headers["ETag"] = f"W/{etag}"
+        if not more_body:
+            key = self.cache_key(etag)
+            compressed = self.middleware.cache.get(key) if key else None
+            if compressed is None:
+                compressed = self.middleware.compress(body, self.encoding)
+                if key:
+                    self.middleware.cache.set(key, compressed)
+            headers["Content-Length"] = str(len(compressed))
+            await self._send(self.start_message)
+            await self._send({"type": "http.response.body", "body": compressed})
+            return
+
+        # 流式响应，长度未知
+        if "content-length" in headers:
+            del headers["Content-Length"]
+        self.compressor = StreamCompressor(self.encoding, self.middleware.gzip_level, self.middleware.brotli_quality)
+        await self._send(self.start_message)
+        await self._send({"type": "http.response.body", "body": self.compressor.compress(body), "more_body": True})
+
+    async def send_body(self, message):
+        if self.passthrough or self.compressor is None or message["type"] != "http.response.body":
+            await self._send(message)
+            return
+        more_body = message.get("more_body", False)
+        data = self.compressor.compress(message.get("body", b""))
+        if not more_body:
+            data += self.compressor.finish()
+        await self._send({"type": "http.response.body", "body": data, "more_body": more_body})
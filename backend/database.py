@@ -1,8 +1,12 @@
-from sqlalchemy import create_engine, Column, String, Integer, Text, ForeignKey, DateTime, Enum, Table, JSON, Boolean, UniqueConstraint
+from sqlalchemy import create_engine, Column, String, Integer, BigInteger, Text, ForeignKey, DateTime, Enum, Table, JSON, Boolean, UniqueConstraint
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, relationship
 from sqlalchemy.sql import func
+from sqlalchemy.pool import QueuePool
+from sqlalchemy import event, exc
 import os
+import time
+import threading
 from dotenv import load_dotenv
 from uuid import uuid4
 from datetime import datetime
@@ -17,9 +21,92 @@ DB_PASSWORD = os.getenv('DB_PASSWORD', '')
 DB_PORT = os.getenv('DB_PORT', '3306')
 DB_NAME = os.getenv('DB_NAME', 'vue_blog')
 
+# 连接池配置
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '10'))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '20'))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '30'))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '3600'))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+
+# 带统计的连接池
+class InstrumentedQueuePool(QueuePool):
+    """记录获取连接的等待时间、超时和溢出连接的 QueuePool"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.timeouts = 0
+        self.overflow_events = 0
+        self.invalidations = 0
+
+    def recreate(self):
+        # pre-ping/失效时连接池会被重建，保留统计数据
+        new_pool = super().recreate()
+        new_pool.__dict__.update({
+            key: getattr(self, key)
+            for key in ("checkouts", "wait_time_total", "wait_time_max", "timeouts", "overflow_events", "invalidations")
+        })
+        return new_pool
+
+    def _do_get(self):
+        overflow_before = self.overflow()
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        wait = time.perf_counter() - start
+        with self._stats_lock:
+            self.checkouts += 1
+            self.wait_time_total += wait
+            self.wait_time_max = max(self.wait_time_max, wait)
+            if self.overflow() > overflow_before and self.overflow() > 0:
+                self.overflow_events += 1
+        return conn
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                "pid": os.getpid(),
+                "poolSize": self.size(),
+                "maxOverflow": self._max_overflow,
+                "checkedOut": self.checkedout(),
+                "checkedIn": self.checkedin(),
+                "overflow": max(self.overflow(), 0),
+                "checkouts": self.checkouts,
+                "waitTimeAvgMs": self.wait_time_total / self.checkouts * 1000 if self.checkouts else 0.0,
+                "waitTimeMaxMs": self.wait_time_max * 1000,
+                "timeouts": self.timeouts,
+                "overflowEvents": self.overflow_events,
+                "invalidations": self.invalidations
+            }
+
 # 创建数据库连接
 DATABASE_URL = f"mysql+mysqlconnector://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
-engine = create_engine(DATABASE_URL)
+engine = create_engine(
+    DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_pre_ping=DB_POOL_PRE_PING
+)
+
+@event.listens_for(engine, "invalidate")
+def count_invalidation(dbapi_connection, connection_record, exception):
+    pool = engine.pool
+    with pool._stats_lock:
+        pool.invalidations += 1
+
+def get_pool_stats():
+    """当前 worker 的连接池状态"""
+    return engine.pool.stats()
 
 # 创建会话
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -77,10 +164,18 @@ class Post(Base):
     title = Column(String(255), nullable=False)
     content = Column(Text, nullable=False)
     description = Column(Text)
+    # 写入时由 post_render.py 从 Markdown 生成，已有文章可运行 post_render.py 补全
+    content_html = Column(Text(16777215))  # MySQL 中为 MEDIUMTEXT，渲染结果可能比原文长
+    excerpt = Column(String(255))
+    word_count = Column(Integer, nullable=False, default=0, server_default="0")
+    reading_time = Column(Integer, nullable=False, default=0, server_default="0")
     author = Column(String(36), ForeignKey("users.id"), nullable=False)
     category_id = Column(String(36), ForeignKey("categories.id"), nullable=False)
     status = Column(Enum("draft", "published", "private"), nullable=False, default="draft")
     views = Column(Integer, nullable=False, default=0)
+    # 冗余计数，由评论和点赞接口在同一事务中维护，可用 post_counters.py 重新统计
+    comment_count = Column(Integer, nullable=False, default=0, server_default="0")
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
     cover_image = Column(String(255))
     publish_date = Column(DateTime)
     created_at = Column(DateTime, nullable=False, default=func.now())
@@ -166,6 +261,17 @@ class RecycleBin(Base):
     content = Column(JSON, nullable=False)
     deleted_at = Column(DateTime, nullable=False, default=func.now())
 
+# 上传文件索引表
+class MediaFile(Base):
+    __tablename__ = "media_files"
+    
+    filename = Column(String(255), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    mtime = Column(DateTime, nullable=False, index=True)
+    mime_class = Column(Enum("image", "document", "other"), nullable=False, index=True)
+    content_hash = Column(String(64), index=True)
+    created_at = Column(DateTime, nullable=False, default=func.now())
+
 # 获取数据库会话
 def get_db():
     db = SessionLocal()
@@ -40,10 +40,16 @@ CREATE TABLE IF NOT EXISTS posts (
     title VARCHAR(255) NOT NULL,
     content TEXT NOT NULL,
     description TEXT,
+    content_html MEDIUMTEXT,
+    excerpt VARCHAR(255),
+    word_count INT NOT NULL DEFAULT 0,
+    reading_time INT NOT NULL DEFAULT 0,
     author VARCHAR(36) NOT NULL,
     category_id VARCHAR(36) NOT NULL,
     status ENUM('draft', 'published', 'private') NOT NULL DEFAULT 'draft',
     views INT NOT NULL DEFAULT 0,
+    comment_count INT NOT NULL DEFAULT 0,
+    like_count INT NOT NULL DEFAULT 0,
     cover_image VARCHAR(255),
     publish_date TIMESTAMP NULL,
     created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
@@ -105,6 +111,19 @@ CREATE TABLE IF NOT EXISTS recycle_bin (
     INDEX idx_deleted_at (deleted_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- 创建上传文件索引表
+CREATE TABLE IF NOT EXISTS media_files (
+    filename VARCHAR(255) PRIMARY KEY,
+    size BIGINT NOT NULL,
+    mtime TIMESTAMP NOT NULL,
+    mime_class ENUM('image', 'document', 'other') NOT NULL,
+    content_hash VARCHAR(64),
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    INDEX idx_mtime (mtime),
+    INDEX idx_mime_class (mime_class),
+    INDEX idx_content_hash (content_hash)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- 插入初始数据
 -- 插入管理员用户
 INSERT INTO users (id, username, email, hashed_password, role, avatar, created_at)
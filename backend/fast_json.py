@@ -0,0 +1,21 @@
+import json
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # 未安装 orjson 时使用标准库 json，仍然跳过 response_model 校验
+    orjson = None
+
+
+def dumps(content) -> bytes:
+    """序列化只包含 JSON 原生类型（str/int/float/bool/None/list/dict）的数据"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """直接编码已经是 API 格式的数据，不经过 jsonable_encoder"""
+
+    def render(self, content) -> bytes:
+        return dumps(content)
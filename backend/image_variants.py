@@ -0,0 +1,220 @@
+import os
+import json
+import time
+import threading
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    from PIL import Image
+except ImportError:  # 未安装 Pillow 时不生成缩略图
+    Image = None
+
+# 各尺寸的最大宽度
+VARIANT_WIDTHS = {"thumbnail": 320, "card": 800, "full": 1920}
+# 只处理位图，SVG 是矢量图，GIF 可能是动图
+SOURCE_EXTENSIONS = {".jpg": "JPEG", ".jpeg": "JPEG", ".png": "PNG", ".webp": "WEBP", ".bmp": "PNG"}
+SAVE_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp"}
+
+
+def manifest_path(variants_dir: Path, filename: str):
+    return variants_dir / f"{filename}.json"
+
+
+def failure_path(variants_dir: Path, filename: str):
+    return variants_dir / f"{filename}.failed"
+
+
+def generate_variants(source_path: str, variants_dir: str):
+    """生成各尺寸的原格式和 WebP 版本，最后写入清单文件，返回清单内容
+
+    在进程池中执行。
+    """
+    source = Path(source_path)
+    variants_dir = Path(variants_dir)
+    source_format = SOURCE_EXTENSIONS[source.suffix.lower()]
+    manifest = {}
+    with Image.open(source) as image:
+        image.load()
+        if source_format == "JPEG" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        for name, width in VARIANT_WIDTHS.items():
+            variant = image.copy()
+            if variant.width > width:
+                variant.thumbnail((width, variant.height), Image.LANCZOS)
+            files = {}
+            for fmt in dict.fromkeys([source_format, "WEBP"]):
+                variant_name = f"{source.name}.{name}{SAVE_EXTENSIONS[fmt]}"
+                tmp_path = variants_dir / f".{variant_name}.tmp"
+                save_options = {"quality": 82} if fmt in ("JPEG", "WEBP") else {"optimize": True}
+                variant.save(tmp_path, fmt, **save_options)
+                os.replace(tmp_path, variants_dir / variant_name)
+                if fmt == source_format:
+                    files["original"] = variant_name
+                if fmt == "WEBP":
+                    files["webp"] = variant_name
+            manifest[name] = files
+
+    tmp_manifest = variants_dir / f".{source.name}.json.tmp"
+    with open(tmp_manifest, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_manifest, manifest_path(variants_dir, source.name))
+    return manifest
+
+
+class ImageVariantGenerator:
+    """在后台进程池中为上传的图片生成缩略图和 WebP 版本
+
+    生成的文件保存在 upload_dir/variants 下，上传文件按内容哈希命名且不会被修改，
+    因此已生成的清单可以一直缓存在内存中。生成失败（如文件损坏）时写入 .failed 标记，
+    retry_after 秒内不再重新提交，避免每次序列化都把同一个文件交给进程池。
+    工作进程异常退出导致进程池不可用时，丢弃进程池，下次提交时重新创建。
+    """
+
+    def __init__(self, upload_dir: Path, url_prefix: str = "/uploads", workers: int = 1, retry_after: float = 3600):
+        self.upload_dir = upload_dir
+        self.variants_dir = upload_dir / "variants"
+        self.variants_dir.mkdir(exist_ok=True)
+        self.url_prefix = url_prefix
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.retry_after = retry_after
+        self._pending = set()
+        self._manifests = {}
+        # 文件名 -> 可以重试的时间
+        self._failures = {}
+
+    @property
+    def enabled(self):
+        return Image is not None
+
+    def supports(self, filename: str):
+        return self.enabled and Path(filename).suffix.lower() in SOURCE_EXTENSIONS
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def _reset_executor(self, executor):
+        """丢弃已损坏的进程池，调用时需持有 self._lock"""
+        if self._executor is executor:
+            self._executor = None
+            executor.shutdown(wait=False)
+
+    def _failed_recently(self, filename: str):
+        """最近生成失败过，还没到重试时间；失败标记由其他 worker 写入时从文件读取失败时间"""
+        retry_at = self._failures.get(filename)
+        if retry_at is None:
+            try:
+                retry_at = failure_path(self.variants_dir, filename).stat().st_mtime + self.retry_after
+            except OSError:
+                return False
+            self._failures[filename] = retry_at
+        if retry_at > time.time():
+            return True
+        self._failures.pop(filename, None)
+        return False
+
+    def _record_failure(self, filename: str, error):
+        try:
+            failure_path(self.variants_dir, filename).write_text(str(error), encoding="utf-8")
+        except OSError:
+            pass
+        with self._lock:
+            self._failures[filename] = time.time() + self.retry_after
+
+    def submit(self, filename: str, on_done=None):
+        """提交生成任务，已生成、正在生成或最近生成失败时忽略"""
+        if not self.supports(filename):
+            return
+        with self._lock:
+            if filename in self._pending or filename in self._manifests:
+                return
+            if manifest_path(self.variants_dir, filename).exists():
+                return
+            if self._failed_recently(filename):
+                return
+            if not (self.upload_dir / filename).is_file():
+                return
+            executor = self._get_executor()
+            try:
+                future = executor.submit(generate_variants, str(self.upload_dir / filename), str(self.variants_dir))
+            except BrokenProcessPool:
+                # 之前的任务使工作进程异常退出，不影响读接口，下次提交时重新创建进程池
+                self._reset_executor(executor)
+                return
+            self._pending.add(filename)
+
+        def finished(future):
+            with self._lock:
+                self._pending.discard(filename)
+                broken = isinstance(future.exception(), BrokenProcessPool)
+                if broken:
+                    self._reset_executor(executor)
+            if broken:
+                # 进程池损坏不代表文件有问题，不记录失败，下次读取时重新提交
+                print(f"生成图片缩略图的进程池异常退出 {filename}: {future.exception()}")
+                return
+            if future.exception() is not None:
+                print(f"生成图片缩略图错误 {filename}: {future.exception()}")
+                self._record_failure(filename, future.exception())
+                return
+            failure_path(self.variants_dir, filename).unlink(missing_ok=True)
+            if on_done:
+                on_done(filename)
+
+        future.add_done_callback(finished)
+
+    def variants_for(self, url: str):
+        """根据 /uploads/xxx.jpg 形式的地址返回各尺寸的地址
+
+        尚未生成时返回 None，并在后台补充生成（例如改造前上传的封面）。
+        """
+        if not url or not url.startswith(self.url_prefix + "/"):
+            return None
+        filename = url[len(self.url_prefix) + 1:]
+        if "/" in filename or not self.supports(filename):
+            return None
+        manifest = self._manifests.get(filename)
+        if manifest is None:
+            try:
+                with open(manifest_path(self.variants_dir, filename), "r", encoding="utf-8") as f:
+                    manifest = json.load(f)
+            except (OSError, ValueError):
+                try:
+                    self.submit(filename)
+                except Exception as e:
+                    # 后台补充生成失败（如无法启动工作进程）不影响读接口
+                    print(f"提交图片缩略图任务错误 {filename}: {e}")
+                return None
+            self._manifests[filename] = manifest
+        return {
+            name: {fmt: f"{self.url_prefix}/variants/{variant_name}" for fmt, variant_name in files.items()}
+            for name, files in manifest.items()
+        }
+
+    def remove(self, filename: str):
+        """删除原图对应的所有缩略图"""
+        self._manifests.pop(filename, None)
+        self._failures.pop(filename, None)
+        failure_path(self.variants_dir, filename).unlink(missing_ok=True)
+        path = manifest_path(self.variants_dir, filename)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        for files in manifest.values():
+            for variant_name in set(files.values()):
+                (self.variants_dir / variant_name).unlink(missing_ok=True)
+        path.unlink(missing_ok=True)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -1,18 +1,36 @@
-from typing import Union, List, Optional
+from typing import Union, List, Optional, Dict
 from datetime import datetime, timedelta
-from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Form, Query
+from fastapi import FastAPI, Depends, HTTPException, status, File, UploadFile, Form, Query, Response, Request, BackgroundTasks
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel, EmailStr, Field
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, EmailStr, Field, constr
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from uuid import uuid4
 import os
-import shutil
+import json
+import asyncio
+import anyio
+import hashlib
+import base64
 from pathlib import Path
-from sqlalchemy.orm import Session
-from database import get_db, User, Category, Tag, Post as DBPost, Comment as DBComment, post_tags, FriendLink
+from sqlalchemy import func, insert
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.orm import Session, joinedload, selectinload, defer, load_only
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from database import get_db, get_pool_stats, SessionLocal, User, Category, Tag, Post as DBPost, Comment as DBComment, post_tags, FriendLink, MediaFile, PostLike
+from view_counter import ViewCounter
+from search_index import SearchIndex, tokenize, highlight
+from response_cache import ResponseCache
+from password_hasher import PasswordHasher, PasswordHasherBusy
+from uploads import store_upload, index_upload, reconcile_upload_index, hash_file, write_compressed_sidecars, remove_compressed_sidecars, rename_compressed_sidecars, UploadTooLarge, UploadTypeNotAllowed, IMAGE_EXTENSIONS, DOCUMENT_EXTENSIONS
+from static_files import UploadStaticFiles
+from compression import CompressionMiddleware, CompressedBodyCache
+from upload_limit import UploadSizeLimitMiddleware
+from fast_json import FastJSONResponse
+from image_variants import ImageVariantGenerator
+from post_counters import adjust_post_counters
+from post_render import PostRenderer
 
 
 # 配置JWT
@@ -23,8 +41,39 @@ SECRET_KEY = os.getenv('SECRET_KEY', "09d25e094faa6ca2556c818166b7a9563b93f7099f
 ALGORITHM = os.getenv('ALGORITHM', "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv('ACCESS_TOKEN_EXPIRE_MINUTES', "30"))
 
-# 密码哈希
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# 线程池大小：同步路由（包括所有数据库访问）都在线程池中执行，不阻塞事件循环
+THREADPOOL_SIZE = int(os.getenv('THREADPOOL_SIZE', "40"))
+
+# 阅读量写回配置
+VIEW_COUNTER_DB = os.getenv('VIEW_COUNTER_DB', "view_counts.db")
+VIEW_FLUSH_INTERVAL = int(os.getenv('VIEW_FLUSH_INTERVAL', "10"))
+view_counter = ViewCounter(VIEW_COUNTER_DB)
+
+# 全文搜索索引配置
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', "search_index.db")
+search_index = SearchIndex(SEARCH_INDEX_PATH)
+
+# 响应缓存配置
+RESPONSE_CACHE_DB = os.getenv('RESPONSE_CACHE_DB', "response_cache.db")
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', "1000"))
+RESPONSE_CACHE_TTL = int(os.getenv('RESPONSE_CACHE_TTL', "60"))
+# 缓存响应的总字节数上限（按响应 JSON 计算），避免少量很大的响应占满内存
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(64 * 1024 * 1024)))
+response_cache = ResponseCache(RESPONSE_CACHE_DB, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_TTL, RESPONSE_CACHE_MAX_BYTES)
+
+# 登录用户缓存配置，与响应缓存共用失效版本号
+USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', "1000"))
+USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', "60"))
+user_cache = ResponseCache(RESPONSE_CACHE_DB, USER_CACHE_MAX_ENTRIES, USER_CACHE_TTL)
+
+# 开启快速序列化的路由（posts、search、comments）：直接用 orjson 编码，跳过 response_model 校验
+FAST_JSON_ROUTES = {name.strip() for name in os.getenv('FAST_JSON_ROUTES', "posts,search,comments").split(",") if name.strip()}
+
+# 密码哈希配置，bcrypt 在独立的进程池中执行
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', "2"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', "16"))
+PASSWORD_HASH_EXECUTOR = os.getenv('PASSWORD_HASH_EXECUTOR', "process")
+password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING, PASSWORD_HASH_EXECUTOR == "process")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
 app = FastAPI(
@@ -53,53 +102,156 @@ app = FastAPI(
     }
 )
 
-# 配置CORS
+# 响应压缩（brotli 需要安装 brotli 包），带强 ETag 的响应会缓存压缩结果
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', "500"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', "4"))
+COMPRESSION_CACHE_MAX_BYTES = int(os.getenv('COMPRESSION_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+compressed_cache = CompressedBodyCache(COMPRESSION_CACHE_MAX_BYTES)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=COMPRESSION_MIN_SIZE,
+    gzip_level=COMPRESSION_GZIP_LEVEL,
+    brotli_quality=COMPRESSION_BROTLI_QUALITY,
+    cache=compressed_cache
+)
+
+# 创建上传目录
+UPLOAD_DIR = Path("uploads")
+UPLOAD_DIR.mkdir(exist_ok=True)
+
+# 图片缩略图（需要安装 Pillow），在后台进程池中生成
+IMAGE_VARIANT_WORKERS = int(os.getenv('IMAGE_VARIANT_WORKERS', "1"))
+# 生成失败的图片在这段时间（秒）内不再重试
+IMAGE_VARIANT_RETRY_AFTER = int(os.getenv('IMAGE_VARIANT_RETRY_AFTER', "3600"))
+image_variants = ImageVariantGenerator(UPLOAD_DIR, "/uploads", IMAGE_VARIANT_WORKERS, IMAGE_VARIANT_RETRY_AFTER)
+
+# 文章 Markdown 渲染（需要安装 markdown 包），超过阈值字符数的文档在进程池中渲染
+POST_RENDER_WORKERS = int(os.getenv('POST_RENDER_WORKERS', "1"))
+POST_RENDER_PROCESS_THRESHOLD = int(os.getenv('POST_RENDER_PROCESS_THRESHOLD', "50000"))
+post_renderer = PostRenderer(POST_RENDER_WORKERS, POST_RENDER_PROCESS_THRESHOLD)
+
+# 上传限制
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', str(10 * 1024 * 1024)))
+UPLOAD_ALLOWED_EXTENSIONS = [
+    ext.strip().lower()
+    for ext in os.getenv('UPLOAD_ALLOWED_EXTENSIONS', ",".join(IMAGE_EXTENSIONS + DOCUMENT_EXTENSIONS)).split(",")
+]
+# multipart 表单除文件外的额外开销
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+# 上传接口的请求体超过上传限制时，在接收和解析表单的过程中直接拒绝
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_body_size=UPLOAD_MAX_SIZE + UPLOAD_FORM_OVERHEAD,
+    path_pattern=r"/api/upload|/api/posts/[^/]+/cover"
+)
+
+# 配置CORS，最后添加的中间件在最外层，上传限制和压缩中间件直接返回的响应（如 413）也带有 CORS 头
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # 在生产环境中应该限制为前端域名
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "ETag"],
 )
 
-# 创建上传目录
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
+def save_upload(file: UploadFile, db: Session, allowed_extensions=None):
+    """保存上传文件并写入文件索引，返回按内容哈希命名的文件名"""
+    try:
+        stored = store_upload(file.file, file.filename, UPLOAD_DIR, UPLOAD_MAX_SIZE, allowed_extensions or UPLOAD_ALLOWED_EXTENSIONS)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="文件过大")
+    except UploadTypeNotAllowed:
+        raise HTTPException(status_code=400, detail="不支持的文件类型")
+    index_upload(db, UPLOAD_DIR, stored.filename, stored.size, stored.content_hash)
+    db.commit()
+    return stored.filename
 
-# 静态文件服务
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# 静态文件服务，按内容哈希命名的文件长期缓存
+UPLOAD_CACHE_MAX_AGE = int(os.getenv('UPLOAD_CACHE_MAX_AGE', "31536000"))
+app.mount("/uploads", UploadStaticFiles(directory="uploads", upload_dir=UPLOAD_DIR, max_age=UPLOAD_CACHE_MAX_AGE), name="uploads")
 
 # 获取上传文件列表接口
-from fastapi.responses import JSONResponse
 from fastapi import Body, Query
 
+UPLOAD_SORT_COLUMNS = {
+    "uploadTime": MediaFile.mtime,
+    "size": MediaFile.size,
+    "filename": MediaFile.filename
+}
+
 @app.get("/api/upload/list", tags=["上传"], summary="获取上传文件列表")
-async def list_upload_files():
-    files = []
-    for file in UPLOAD_DIR.iterdir():
-        if file.is_file():
-            stat = file.stat()
-            files.append({
-                "filename": file.name,
-                "filepath": f"/uploads/{file.name}",
-                "size": stat.st_size,
-                "uploadTime": datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S"),
-                "mimetype": "image" if file.suffix.lower() in [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp"] else "document" if file.suffix.lower() in [".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".txt"] else "other"
-            })
-    return JSONResponse(content=files)
+def list_upload_files(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=500, description="每页数量，不传返回全部"),
+    offset: int = Query(0, ge=0),
+    sort: str = Query("uploadTime", regex="^(uploadTime|size|filename)$"),
+    order: str = Query("desc", regex="^(asc|desc)$"),
+    mimetype: Optional[str] = Query(None, regex="^(image|document|other)$"),
+    q: Optional[str] = Query(None, description="按文件名搜索"),
+    db: Session = Depends(get_db)
+):
+    query = db.query(MediaFile)
+    if mimetype:
+        query = query.filter(MediaFile.mime_class == mimetype)
+    if q:
+        query = query.filter(MediaFile.filename.contains(q, autoescape=True))
+    response.headers["X-Total-Count"] = str(query.count())
+
+    column = UPLOAD_SORT_COLUMNS[sort]
+    if order == "desc":
+        query = query.order_by(column.desc(), MediaFile.filename.desc())
+    else:
+        query = query.order_by(column.asc(), MediaFile.filename.asc())
+    query = query.offset(offset)
+    if limit:
+        query = query.limit(limit)
+    return [
+        {
+            "filename": media.filename,
+            "filepath": f"/uploads/{media.filename}",
+            "size": media.size,
+            "uploadTime": media.mtime.strftime("%Y-%m-%d %H:%M:%S"),
+            "mimetype": media.mime_class,
+            "contentHash": media.content_hash
+        }
+        for media in query.all()
+    ]
 
 # 删除上传文件
 @app.delete("/api/upload/delete", tags=["上传"], summary="删除上传文件")
-async def delete_upload_file(filename: str = Query(..., description="要删除的文件名")):
+def delete_upload_file(
+    filename: str = Query(..., description="要删除的文件名"),
+    force: bool = Query(False, description="文件仍被文章引用时也删除"),
+    db: Session = Depends(get_db)
+):
     file_path = UPLOAD_DIR / filename
     if not file_path.exists() or not file_path.is_file():
         return JSONResponse(content={"success": False, "msg": "文件不存在"}, status_code=404)
+    # 相同内容的上传共用一个文件，可能被多篇文章作为封面或在正文中引用
+    url = f"/uploads/{filename}"
+    if not force:
+        referenced = db.query(DBPost.id, DBPost.title).filter(
+            (DBPost.cover_image == url) | DBPost.content.contains(url, autoescape=True)
+        ).limit(20).all()
+        if referenced:
+            return JSONResponse(content={
+                "success": False,
+                "msg": "文件仍被文章引用",
+                "posts": [{"id": post_id, "title": title} for post_id, title in referenced]
+            }, status_code=409)
     file_path.unlink()
+    remove_compressed_sidecars(UPLOAD_DIR, filename)
+    db.query(MediaFile).filter(MediaFile.filename == filename).delete(synchronize_session=False)
+    db.commit()
+    image_variants.remove(filename)
     return {"success": True, "msg": "文件已删除"}
 
 # 重命名上传文件
 @app.post("/api/upload/rename", tags=["上传"], summary="重命名上传文件")
-async def rename_upload_file(data: dict = Body(...)):
+def rename_upload_file(data: dict = Body(...), db: Session = Depends(get_db)):
     oldname = data.get("oldname")
     newname = data.get("newname")
     if not oldname or not newname:
@@ -111,6 +263,13 @@ async def rename_upload_file(data: dict = Body(...)):
     if new_path.exists():
         return JSONResponse(content={"success": False, "msg": "目标文件已存在"}, status_code=400)
     old_path.rename(new_path)
+    rename_compressed_sidecars(UPLOAD_DIR, oldname, newname)
+    media = db.query(MediaFile).filter(MediaFile.filename == oldname).first()
+    content_hash = media.content_hash if media else hash_file(new_path)
+    db.query(MediaFile).filter(MediaFile.filename == oldname).delete(synchronize_session=False)
+    index_upload(db, UPLOAD_DIR, newname, new_path.stat().st_size, content_hash)
+    db.commit()
+    image_variants.remove(oldname)
     return {"success": True, "msg": "文件已重命名"}
 
 # 数据模型
@@ -142,18 +301,21 @@ class LoginResponse(BaseModel):
     token: str
     user: UserInfo
 
+# 与 categories.name、tags.name 列的长度一致，超长时返回 422，不会被数据库截断
+TaxonomyName = constr(max_length=50)
+
 class TagBase(BaseModel):
-    name: str
+    name: TaxonomyName
 
 class CategoryBase(BaseModel):
-    name: str
+    name: TaxonomyName
 
 class PostBase(BaseModel):
     title: str
     content: str
     description: Optional[str] = None
-    category: str
-    tags: List[str] = []
+    category: TaxonomyName
+    tags: List[TaxonomyName] = []
     status: str = "draft"  # draft, published, private
 
 class PostCreate(PostBase):
@@ -169,7 +331,37 @@ class Post(PostBase):
     publishDate: Optional[str] = None
     updateTime: str
     coverImage: Optional[str] = None
+    coverImageVariants: Optional[Dict[str, Dict[str, str]]] = None
+    commentCount: int = 0
+    likeCount: int = 0
+    excerpt: Optional[str] = None
+    wordCount: int = 0
+    readingTime: int = 0
+    contentHtml: Optional[str] = None
+
+class PostSummary(BaseModel):
+    """文章摘要，不包含正文内容"""
+    id: str
+    title: str
+    description: Optional[str] = None
+    category: str
+    tags: List[str] = []
+    status: str
+    author: str
+    views: int = 0
+    publishDate: Optional[str] = None
+    updateTime: str
+    coverImage: Optional[str] = None
+    coverImageVariants: Optional[Dict[str, Dict[str, str]]] = None
     commentCount: int = 0
+    likeCount: int = 0
+    excerpt: Optional[str] = None
+    wordCount: int = 0
+    readingTime: int = 0
+
+class SearchResult(Post):
+    highlight: Optional[str] = None
+    score: float = 0
 
 class CommentBase(BaseModel):
     content: str
@@ -184,6 +376,24 @@ class Comment(CommentBase):
     createdAt: str
     parentId: Optional[str] = None
 
+class CommentNode(Comment):
+    replies: List["CommentNode"] = []
+
+CommentNode.update_forward_refs()
+
+class CommentThread(CommentNode):
+    replyCount: int = 0
+    repliesCursor: Optional[str] = None
+
+class CommentTreePage(BaseModel):
+    items: List[CommentThread]
+    totalThreads: int
+    nextCursor: Optional[str] = None
+
+class CommentRepliesPage(BaseModel):
+    items: List[CommentNode]
+    nextCursor: Optional[str] = None
+
 class FileResponse(BaseModel):
     filename: str
     filepath: str
@@ -197,10 +407,16 @@ role_permissions = {
 
 # 辅助函数
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    try:
+        return password_hasher.verify(plain_password, hashed_password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="登录请求过多，请稍后再试")
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    try:
+        return password_hasher.hash(password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=503, detail="注册请求过多，请稍后再试")
 
 def get_user(db: Session, username: str):
     return db.query(User).filter(User.username == username).first()
@@ -226,7 +442,46 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+def cached_response(request: Request, tags, compute):
+    """按路由和查询参数缓存 compute() 的结果，tags 为结果依赖的数据标签
+
+    返回 (结果, ETag)，ETag 为结果内容的哈希，只在缓存填充时计算一次。
+    缓存键只包含路由声明的查询参数，附加的未知参数（如 ?_=时间戳）不会产生新的缓存项。
+    """
+    route = request.scope.get("route")
+    declared = {param.alias for param in route.dependant.query_params} if route is not None else set()
+    params = sorted((name, value) for name, value in request.query_params.multi_items() if name in declared)
+    key = f"{request.url.path}?{params}"
+    entry = response_cache.get(key)
+    if entry is None:
+        versions = response_cache.versions(tags)
+        value = compute()
+        if value is None:
+            return None, None
+        body = json.dumps(jsonable_encoder(value), sort_keys=True, ensure_ascii=False)
+        body = body.encode()
+        entry = (value, f'"{hashlib.sha1(body).hexdigest()}"')
+        response_cache.set(key, entry, versions, len(body))
+    return entry
+
+def etag_matches(if_none_match: Optional[str], etag: str):
+    """If-None-Match 使用弱比较，忽略 W/ 前缀"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag.replace("W/", "") in [tag.replace("W/", "") for tag in tags]
+
+def conditional_response(request: Request, response: Response, etag: str, result):
+    """设置 ETag，客户端缓存仍然有效时直接返回 304，不再序列化响应体"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return result
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -240,21 +495,28 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = get_user(db, username=token_data.username)
-    if user is None:
-        raise credentials_exception
     
-    # 添加权限信息
-    user_dict = {
-        "id": user.id,
-        "username": user.username,
-        "email": user.email,
-        "role": user.role,
-        "avatar": user.avatar,
-        "createdAt": user.created_at.isoformat(),
-        "permissions": get_user_permissions(user.role)
-    }
-    return user_dict
+    # 优先使用缓存的用户信息，命中时不访问数据库
+    cache_key = f"user:{token_data.username}"
+    user_dict = user_cache.get(cache_key)
+    if user_dict is None:
+        versions = user_cache.versions((cache_key,))
+        user = get_user(db, username=token_data.username)
+        if user is None:
+            raise credentials_exception
+        
+        # 添加权限信息
+        user_dict = {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "role": user.role,
+            "avatar": user.avatar,
+            "createdAt": user.created_at.isoformat(),
+            "permissions": get_user_permissions(user.role)
+        }
+        user_cache.set(cache_key, user_dict, versions)
+    return dict(user_dict)
 
 # Settings API
 
@@ -287,13 +549,17 @@ class AdvancedSettingsModel(BaseModel):
     seo: dict = {}
     cdn: dict = {}
 
-@app.get("/api/settings/basic", tags=["设置"], response_model=BasicSettingsModel)
-def get_basic_settings(db: Session = Depends(get_db)):
-    setting = db.query(Setting).filter_by(key="basic", category="basic").first()
+def load_settings(db: Session, key: str, model):
+    setting = db.query(Setting).filter_by(key=key, category=key).first()
     if setting:
         return setting.value
     # 返回默认
-    return BasicSettingsModel().dict()
+    return model().dict()
+
+@app.get("/api/settings/basic", tags=["设置"], response_model=BasicSettingsModel)
+def get_basic_settings(request: Request, response: Response, db: Session = Depends(get_db)):
+    result, etag = cached_response(request, ("settings:basic",), lambda: load_settings(db, "basic", BasicSettingsModel))
+    return conditional_response(request, response, etag, result)
 
 @app.put("/api/settings/basic", tags=["设置"], response_model=BasicSettingsModel)
 def update_basic_settings(data: BasicSettingsModel, db: Session = Depends(get_db)):
@@ -304,14 +570,13 @@ def update_basic_settings(data: BasicSettingsModel, db: Session = Depends(get_db
     else:
         setting.value = data.dict()
     db.commit()
+    response_cache.invalidate("settings:basic")
     return setting.value
 
 @app.get("/api/settings/profile", tags=["设置"], response_model=ProfileSettingsModel)
-def get_profile_settings(db: Session = Depends(get_db)):
-    setting = db.query(Setting).filter_by(key="profile", category="profile").first()
-    if setting:
-        return setting.value
-    return ProfileSettingsModel().dict()
+def get_profile_settings(request: Request, response: Response, db: Session = Depends(get_db)):
+    result, etag = cached_response(request, ("settings:profile",), lambda: load_settings(db, "profile", ProfileSettingsModel))
+    return conditional_response(request, response, etag, result)
 
 @app.put("/api/settings/profile", tags=["设置"], response_model=ProfileSettingsModel)
 def update_profile_settings(data: ProfileSettingsModel, db: Session = Depends(get_db)):
@@ -322,14 +587,13 @@ def update_profile_settings(data: ProfileSettingsModel, db: Session = Depends(ge
     else:
         setting.value = data.dict()
     db.commit()
+    response_cache.invalidate("settings:profile")
     return setting.value
 
 @app.get("/api/settings/advanced", tags=["设置"], response_model=AdvancedSettingsModel)
-def get_advanced_settings(db: Session = Depends(get_db)):
-    setting = db.query(Setting).filter_by(key="advanced", category="advanced").first()
-    if setting:
-        return setting.value
-    return AdvancedSettingsModel().dict()
+def get_advanced_settings(request: Request, response: Response, db: Session = Depends(get_db)):
+    result, etag = cached_response(request, ("settings:advanced",), lambda: load_settings(db, "advanced", AdvancedSettingsModel))
+    return conditional_response(request, response, etag, result)
 
 @app.put("/api/settings/advanced", tags=["设置"], response_model=AdvancedSettingsModel)
 def update_advanced_settings(data: AdvancedSettingsModel, db: Session = Depends(get_db)):
@@ -340,6 +604,7 @@ def update_advanced_settings(data: AdvancedSettingsModel, db: Session = Depends(
     else:
         setting.value = data.dict()
     db.commit()
+    response_cache.invalidate("settings:advanced")
     return setting.value
 
 # 路由
@@ -374,8 +639,7 @@ def admin_required(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="只有管理员可以操作")
     return current_user
 
-@app.get("/api/friend-links", tags=["友情链接"], summary="获取所有友情链接", response_model=List[FriendLinkOut])
-async def get_friend_links(db: Session = Depends(get_db)):
+def load_friend_links(db: Session):
     links = db.query(FriendLink).order_by(FriendLink.created_at.desc()).all()
     return [
         FriendLinkOut(
@@ -389,8 +653,13 @@ async def get_friend_links(db: Session = Depends(get_db)):
         ) for link in links
     ]
 
+@app.get("/api/friend-links", tags=["友情链接"], summary="获取所有友情链接", response_model=List[FriendLinkOut])
+def get_friend_links(request: Request, response: Response, db: Session = Depends(get_db)):
+    result, etag = cached_response(request, ("friend_links",), lambda: load_friend_links(db))
+    return conditional_response(request, response, etag, result)
+
 @app.post("/api/friend-links", tags=["友情链接"], summary="新增友情链接", response_model=FriendLinkOut)
-async def create_friend_link(link: FriendLinkCreate, db: Session = Depends(get_db), current_user: dict = Depends(admin_required)):
+def create_friend_link(link: FriendLinkCreate, db: Session = Depends(get_db), current_user: dict = Depends(admin_required)):
     new_link = FriendLink(
         name=link.name,
         url=link.url,
@@ -401,6 +670,7 @@ async def create_friend_link(link: FriendLinkCreate, db: Session = Depends(get_d
     db.add(new_link)
     db.commit()
     db.refresh(new_link)
+    response_cache.invalidate("friend_links")
     return FriendLinkOut(
         id=new_link.id,
         name=new_link.name,
@@ -412,16 +682,17 @@ async def create_friend_link(link: FriendLinkCreate, db: Session = Depends(get_d
     )
 
 @app.delete("/api/friend-links/{link_id}", tags=["友情链接"], summary="删除友情链接")
-async def delete_friend_link(link_id: str, db: Session = Depends(get_db), current_user: dict = Depends(admin_required)):
+def delete_friend_link(link_id: str, db: Session = Depends(get_db), current_user: dict = Depends(admin_required)):
     link = db.query(FriendLink).filter(FriendLink.id == link_id).first()
     if not link:
         raise HTTPException(status_code=404, detail="友链不存在")
     db.delete(link)
     db.commit()
+    response_cache.invalidate("friend_links")
     return {"message": "删除成功"}
 
 @app.put("/api/friend-links/{link_id}", tags=["友情链接"], summary="更新友情链接", response_model=FriendLinkOut)
-async def update_friend_link(link_id: str, link: FriendLinkUpdate, db: Session = Depends(get_db), current_user: dict = Depends(admin_required)):
+def update_friend_link(link_id: str, link: FriendLinkUpdate, db: Session = Depends(get_db), current_user: dict = Depends(admin_required)):
     db_link = db.query(FriendLink).filter(FriendLink.id == link_id).first()
     if not db_link:
         raise HTTPException(status_code=404, detail="友链不存在")
@@ -432,6 +703,7 @@ async def update_friend_link(link_id: str, link: FriendLinkUpdate, db: Session =
     db_link.status = link.status
     db.commit()
     db.refresh(db_link)
+    response_cache.invalidate("friend_links")
     return FriendLinkOut(
         id=db_link.id,
         name=db_link.name,
@@ -442,13 +714,25 @@ async def update_friend_link(link_id: str, link: FriendLinkUpdate, db: Session =
         created_at=db_link.created_at.isoformat()
     )
 
+@app.get("/api/cache/stats", tags=["系统"], summary="缓存统计", description="返回响应缓存、登录用户缓存和压缩结果缓存的命中、未命中和淘汰次数")
+async def get_cache_stats(current_user: dict = Depends(admin_required)):
+    return {"responses": response_cache.stats(), "users": user_cache.stats(), "compressed": compressed_cache.stats()}
+
+@app.get("/api/db/pool-stats", tags=["系统"], summary="数据库连接池统计", description="返回当前 worker 的连接池使用情况、获取连接的等待时间和溢出次数")
+async def get_db_pool_stats(current_user: dict = Depends(admin_required)):
+    return get_pool_stats()
+
+@app.get("/api/auth/hasher-stats", tags=["系统"], summary="密码哈希统计", description="返回密码哈希进程池的并发、排队和耗时统计")
+async def get_password_hasher_stats(current_user: dict = Depends(admin_required)):
+    return password_hasher.stats()
+
 @app.get("/", tags=["系统"], summary="API根路径", description="返回API欢迎信息")
 def read_root():
     return {"message": "欢迎使用Vue博客API系统"}
 
 # 用户认证路由
 @app.post("/token", response_model=Token, tags=["认证"], summary="获取访问令牌", description="用户登录并获取JWT访问令牌")
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     user = authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
@@ -463,7 +747,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @app.post("/api/login", response_model=LoginResponse, tags=["认证"], summary="用户登录", description="用户登录并获取用户信息与访问令牌")
-async def login(login_data: UserLogin, db: Session = Depends(get_db)):
+def login(login_data: UserLogin, db: Session = Depends(get_db)):
     user = authenticate_user(db, login_data.username, login_data.password)
     if not user:
         raise HTTPException(
@@ -487,7 +771,7 @@ async def login(login_data: UserLogin, db: Session = Depends(get_db)):
     }
 
 @app.post("/api/register", response_model=UserInfo, tags=["认证"], summary="用户注册", description="创建新用户账号")
-async def register(user_data: UserCreate, db: Session = Depends(get_db)):
+def register(user_data: UserCreate, db: Session = Depends(get_db)):
     # 检查用户名是否已存在
     existing_user = db.query(User).filter(User.username == user_data.username).first()
     if existing_user:
@@ -545,7 +829,7 @@ class UserProfileUpdate(BaseModel):
     avatar: Optional[str] = None
 
 @app.put("/api/users/profile", response_model=UserInfo, tags=["用户"], summary="更新个人资料", description="更新当前登录用户的个人资料")
-async def update_profile(profile_data: UserProfileUpdate, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_profile(profile_data: UserProfileUpdate, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     # 检查用户权限
     if "update_profile" not in current_user.get("permissions", []):
         raise HTTPException(status_code=403, detail="没有权限更新个人资料")
@@ -568,6 +852,7 @@ async def update_profile(profile_data: UserProfileUpdate, current_user: dict = D
     
     db.commit()
     db.refresh(user)
+    user_cache.invalidate(f"user:{user.username}")
     
     return {
         "id": user.id,
@@ -579,91 +864,336 @@ async def update_profile(profile_data: UserProfileUpdate, current_user: dict = D
     }
 
 # 文章相关路由
-@app.get("/api/posts", response_model=List[Post], tags=["文章"], summary="获取文章列表", description="获取所有文章或按状态、分类筛选文章")
-async def get_posts(status: Optional[str] = None, category: Optional[str] = None, db: Session = Depends(get_db)):
-    query = db.query(DBPost)
-    
-    if status:
-        query = query.filter(DBPost.status == status)
-    
-    if category:
-        query = query.join(Category).filter(Category.name == category)
-    
-    db_posts = query.all()
-    
-    # 转换为API模型
+# API 字段 -> 需要从 posts 表读取的列
+POST_FIELD_COLUMNS = {
+    "id": [],
+    "title": [DBPost.title],
+    "content": [DBPost.content],
+    "description": [DBPost.description],
+    "category": [DBPost.category_id],
+    "tags": [],
+    "status": [DBPost.status],
+    "author": [DBPost.author],
+    "views": [DBPost.views],
+    "publishDate": [DBPost.publish_date],
+    "updateTime": [DBPost.updated_at],
+    "coverImage": [DBPost.cover_image],
+    "coverImageVariants": [DBPost.cover_image],
+    "commentCount": [DBPost.comment_count],
+    "likeCount": [DBPost.like_count],
+    "excerpt": [DBPost.excerpt],
+    "wordCount": [DBPost.word_count],
+    "readingTime": [DBPost.reading_time],
+    "contentHtml": [DBPost.content_html]
+}
+
+# API 字段 -> 从数据库文章取值
+POST_FIELD_GETTERS = {
+    "id": lambda post: post.id,
+    "title": lambda post: post.title,
+    "content": lambda post: post.content,
+    "description": lambda post: post.description,
+    "category": lambda post: post.category.name,
+    "tags": lambda post: [tag.name for tag in post.tags],
+    "status": lambda post: post.status,
+    "author": lambda post: post.user.username,
+    "views": lambda post: post.views,
+    "publishDate": lambda post: post.publish_date.isoformat() if post.publish_date else None,
+    "updateTime": lambda post: post.updated_at.isoformat(),
+    "coverImage": lambda post: post.cover_image,
+    "coverImageVariants": lambda post: image_variants.variants_for(post.cover_image),
+    "commentCount": lambda post: post.comment_count,
+    "likeCount": lambda post: post.like_count,
+    "excerpt": lambda post: post.excerpt,
+    "wordCount": lambda post: post.word_count,
+    "readingTime": lambda post: post.reading_time,
+    "contentHtml": lambda post: post.content_html
+}
+
+# contentHtml 只在 format=html 或 fields 中指定时返回
+POST_FIELDS = [name for name in POST_FIELD_GETTERS if name != "contentHtml"]
+POST_SUMMARY_FIELDS = [name for name in POST_FIELDS if name != "content"]
+
+def parse_fields(fields: Optional[str], model):
+    """解析 fields=title,author 参数，字段必须属于 model；未传时返回 None 表示全部字段"""
+    if fields is None:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in model.__fields__]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知字段: {', '.join(unknown)}")
+    # id 始终返回
+    return ["id"] + [name for name in names if name != "id"]
+
+def apply_content_format(fields: Optional[List[str]], content_format: str, summary: bool = False):
+    """format=html 时用渲染好的 contentHtml 代替 Markdown 正文 content"""
+    if content_format != "html":
+        return fields
+    if fields is None:
+        fields = POST_SUMMARY_FIELDS if summary else POST_FIELDS
+    return [("contentHtml" if name == "content" else name) for name in fields]
+
+def post_query(db: Session, fields: Optional[List[str]] = None):
+    """文章查询，预加载作者、分类和标签，避免逐行懒加载
+
+    指定 fields 时只读取这些字段需要的列，只预加载需要的关联。
+    """
+    if fields is None:
+        return db.query(DBPost).options(
+            defer(DBPost.content_html),
+            joinedload(DBPost.user),
+            joinedload(DBPost.category),
+            selectinload(DBPost.tags)
+        )
+    # publish_date 用于游标分页，始终读取
+    columns = {DBPost.publish_date}
+    for name in fields:
+        columns.update(POST_FIELD_COLUMNS.get(name, []))
+    options = [load_only(DBPost.id, *columns)]
+    if "author" in fields:
+        options.append(joinedload(DBPost.user))
+    if "category" in fields:
+        options.append(joinedload(DBPost.category))
+    if "tags" in fields:
+        options.append(selectinload(DBPost.tags))
+    return db.query(DBPost).options(*options)
+
+def direct_response(result, response: Optional[Response] = None):
+    """直接序列化结果，不经过 response_model 校验和 jsonable_encoder
+
+    用于按 fields 裁剪后的结果（不完整，无法通过校验）和 FAST_JSON_ROUTES 中的路由。
+    结果由 serialize_posts 等函数从数据库列构造，已经符合响应模型，且只包含 JSON 原生类型。
+    """
+    if isinstance(result, Response):
+        return result
+    headers = None
+    if response is not None:
+        headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+    return FastJSONResponse(content=result, headers=headers)
+
+def get_or_create_by_name(db: Session, model, names: List[str]):
+    """按名称批量获取分类或标签，不存在的批量创建，按请求的顺序返回去重后的对象
+
+    一次 IN 查询取出已有的记录；缺少的用 INSERT ... ON DUPLICATE KEY UPDATE 一次插入，
+    其他请求同时创建了同名记录时不会报错，其他错误照常抛出（INSERT IGNORE 会把超长等错误
+    变成警告并截断数据）。插入后用加锁读取回，能读到其他事务刚提交的记录。
+    每个名称都对应到一条记录，无法对应时返回 400，因此传入非空列表时结果不为空。
+    所有操作在调用方的事务中执行，不提交。
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return []
+    found = {item.name: item for item in db.query(model).filter(model.name.in_(names))}
+    missing = [name for name in names if name not in found]
+    if missing:
+        # 重复时保留已有记录的名称（包括大小写），不修改任何列
+        upsert = mysql_insert(model).on_duplicate_key_update(name=model.__table__.c.name)
+        db.execute(upsert, [{"name": name} for name in missing])
+        found.update({item.name: item for item in db.query(model).filter(model.name.in_(missing)).with_for_update(read=True)})
+    # 数据库按排序规则比较名称（忽略大小写、重音和末尾空格），已有的名称可能与请求的不同，
+    # 在 Python 中匹配不到的名称逐个交给数据库比较
+    folded = {item.name.casefold(): item for item in found.values()}
     result = []
-    for post in db_posts:
-        # 获取标签列表
-        tags = [tag.name for tag in post.tags]
+    for name in names:
+        item = found.get(name) or folded.get(name.casefold())
+        if item is None:
+            item = db.query(model).filter(model.name == name).with_for_update(read=True).first()
+        if item is None:
+            raise HTTPException(status_code=400, detail=f"无法创建名称: {name}")
+        if item not in result:
+            result.append(item)
+    return result
+
+def serialize_posts(db: Session, posts: List[DBPost], summary: bool = False, fields: Optional[List[str]] = None):
+    """批量将数据库文章转换为API格式，查询次数与文章数量无关
+
+    摘要模式下正文未从数据库加载，不能访问；指定 fields 时只输出这些字段。
+    """
+    if fields is None:
+        fields = POST_SUMMARY_FIELDS if summary else POST_FIELDS
+    getters = [(name, POST_FIELD_GETTERS[name]) for name in fields if name in POST_FIELD_GETTERS]
+    return [{name: getter(post) for name, getter in getters} for post in posts]
+
+def serialize_post(db: Session, post: DBPost):
+    return serialize_posts(db, [post])[0]
+
+def index_post(post: DBPost):
+    """同步文章到搜索索引，只收录已发布的文章"""
+    if post.status == "published":
+        search_index.add(post.id, post.title, post.content, post.updated_at.isoformat())
+    else:
+        search_index.remove(post.id)
+
+def encode_post_cursor(post: DBPost):
+    """将(publish_date, id)编码为不透明的分页游标"""
+    raw = json.dumps([post.publish_date.isoformat() if post.publish_date else None, post.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_post_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        publish_date, post_id = json.loads(raw)
+        return (datetime.fromisoformat(publish_date) if publish_date else None), str(post_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+def apply_post_cursor(query, cursor: Optional[str]):
+    """按(publish_date DESC, id DESC)排序，未发布(publish_date为空)的文章排在最后"""
+    if cursor:
+        publish_date, post_id = decode_post_cursor(cursor)
+        if publish_date is None:
+            query = query.filter(DBPost.publish_date.is_(None), DBPost.id < post_id)
+        else:
+            query = query.filter(
+                (DBPost.publish_date < publish_date) |
+                ((DBPost.publish_date == publish_date) & (DBPost.id < post_id)) |
+                DBPost.publish_date.is_(None)
+            )
+    return query.order_by(DBPost.publish_date.is_(None), DBPost.publish_date.desc(), DBPost.id.desc())
+
+@app.get("/api/posts", response_model=List[Union[Post, PostSummary]], tags=["文章"], summary="获取文章列表", description="获取所有文章或按状态、分类筛选文章，支持游标分页和摘要模式")
+def get_posts(
+    request: Request,
+    response: Response,
+    status: Optional[str] = None,
+    category: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=100, description="每页数量，不传则返回全部"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 返回的游标"),
+    summary: bool = Query(False, description="摘要模式，不返回正文内容"),
+    fields: Optional[str] = Query(None, description="只返回这些字段，逗号分隔，如 title,author,publishDate"),
+    format: str = Query("markdown", regex="^(markdown|html)$", description="正文格式，html 时返回 contentHtml 代替 content"),
+    db: Session = Depends(get_db)
+):
+    selected = apply_content_format(parse_fields(fields, Post), format, summary)
+    
+    def load_posts():
+        query = post_query(db, selected)
         
-        # 计算评论数
-        comment_count = db.query(DBComment).filter(DBComment.post_id == post.id).count()
+        if summary and selected is None:
+            query = query.options(defer(DBPost.content))
         
-        result.append({
-            "id": post.id,
-            "title": post.title,
-            "content": post.content,
-            "description": post.description,
-            "category": post.category.name,
-            "tags": tags,
-            "status": post.status,
-            "author": post.user.username,
-            "views": post.views,
-            "publishDate": post.publish_date.isoformat() if post.publish_date else None,
-            "updateTime": post.updated_at.isoformat(),
-            "coverImage": post.cover_image,
-            "commentCount": comment_count
-        })
-    
-    return result
+        if status:
+            query = query.filter(DBPost.status == status)
+        
+        if category:
+            query = query.join(Category).filter(Category.name == category)
+        
+        query = apply_post_cursor(query, cursor)
+        
+        next_cursor = None
+        if limit:
+            # 多取一条用于判断是否还有下一页
+            db_posts = query.limit(limit + 1).all()
+            if len(db_posts) > limit:
+                db_posts = db_posts[:limit]
+                next_cursor = encode_post_cursor(db_posts[-1])
+        else:
+            db_posts = query.all()
+        
+        # 转换为API模型
+        return serialize_posts(db, db_posts, summary=summary, fields=selected), next_cursor
+    
+    (result, next_cursor), etag = cached_response(request, ("posts",), load_posts)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    result = conditional_response(request, response, etag, result)
+    return direct_response(result, response) if selected or "posts" in FAST_JSON_ROUTES else result
+
+# 批量接口，需要在 /api/posts/{post_id} 之前注册
+BATCH_MAX_IDS = 100
+
+def parse_post_ids(ids: List[str]):
+    """支持 ids=a&ids=b 和 ids=a,b 两种写法，去重并保持顺序"""
+    post_ids = list(dict.fromkeys(
+        post_id.strip() for value in ids for post_id in value.split(",") if post_id.strip()
+    ))
+    if len(post_ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"一次最多查询 {BATCH_MAX_IDS} 篇文章")
+    return post_ids
+
+@app.get("/api/posts/batch", response_model=List[PostSummary], tags=["文章"], summary="批量获取文章", description="按ID批量获取文章摘要（不含正文），按请求的顺序返回，不存在的文章忽略")
+def get_posts_batch(
+    request: Request,
+    response: Response,
+    ids: List[str] = Query(..., description="文章ID列表"),
+    fields: Optional[str] = Query(None, description="只返回这些字段，逗号分隔，如 title,author,publishDate"),
+    db: Session = Depends(get_db)
+):
+    post_ids = parse_post_ids(ids)
+    selected = parse_fields(fields, PostSummary)
+
+    def load_posts():
+        if not post_ids:
+            return {}
+        query = post_query(db, selected)
+        if selected is None:
+            query = query.options(defer(DBPost.content))
+        db_posts = query.filter(DBPost.id.in_(post_ids)).all()
+        return {post["id"]: post for post in serialize_posts(db, db_posts, summary=True, fields=selected)}
+
+    # 缓存键不区分参数顺序，因此缓存 {id: 文章}，再按本次请求的顺序排列
+    by_id, etag = cached_response(request, ("posts",) + tuple(f"post:{post_id}" for post_id in post_ids), load_posts)
+    result = [by_id[post_id] for post_id in post_ids if post_id in by_id]
+    result = conditional_response(request, response, etag, result)
+    return direct_response(result, response) if selected else result
+
+@app.get("/api/posts/likes", tags=["文章"], summary="批量获取点赞数", description="按ID批量获取文章点赞数，不存在的文章忽略")
+def get_post_likes_batch(ids: List[str] = Query(..., description="文章ID列表"), db: Session = Depends(get_db)):
+    post_ids = parse_post_ids(ids)
+    rows = db.query(DBPost.id, DBPost.like_count).filter(DBPost.id.in_(post_ids)).all() if post_ids else []
+    return {"likes": {post_id: like_count for post_id, like_count in rows}}
+
+@app.get("/api/posts/liked", tags=["文章"], summary="批量获取点赞状态", description="返回当前用户是否点赞了这些文章")
+def get_posts_liked(ids: List[str] = Query(..., description="文章ID列表"), current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    post_ids = parse_post_ids(ids)
+    liked = set()
+    if post_ids:
+        liked = {
+            post_id for post_id, in db.query(PostLike.post_id).filter(
+                PostLike.user_id == current_user["id"],
+                PostLike.post_id.in_(post_ids)
+            )
+        }
+    return {"liked": {post_id: post_id in liked for post_id in post_ids}}
 
 @app.get("/api/posts/{post_id}", response_model=Post, tags=["文章"], summary="获取单篇文章", description="根据文章ID获取文章详情")
-async def get_post(post_id: str, db: Session = Depends(get_db)):
-    post = db.query(DBPost).filter(DBPost.id == post_id).first()
-    if not post:
+def get_post(
+    post_id: str,
+    request: Request,
+    response: Response,
+    fields: Optional[str] = Query(None, description="只返回这些字段，逗号分隔，如 title,author,publishDate"),
+    format: str = Query("markdown", regex="^(markdown|html)$", description="正文格式，html 时返回 contentHtml 代替 content"),
+    db: Session = Depends(get_db)
+):
+    selected = apply_content_format(parse_fields(fields, Post), format)
+    
+    def load_post():
+        post = post_query(db, selected).filter(DBPost.id == post_id).first()
+        return serialize_posts(db, [post], fields=selected)[0] if post else None
+    
+    cached, etag = cached_response(request, ("posts", f"post:{post_id}"), load_post)
+    if cached is None:
         raise HTTPException(status_code=404, detail="文章未找到")
     
-    # 增加阅读量
-    post.views += 1
-    db.commit()
-    
-    # 获取标签列表
-    tags = [tag.name for tag in post.tags]
+    # 增加阅读量，由后台任务批量写入数据库
+    pending_views = view_counter.incr(post_id)
+    result = dict(cached)
+    if "views" in result:
+        result["views"] = cached["views"] + pending_views
     
-    # 计算评论数
-    comment_count = db.query(DBComment).filter(DBComment.post_id == post.id).count()
-    
-    return {
-        "id": post.id,
-        "title": post.title,
-        "content": post.content,
-        "description": post.description,
-        "category": post.category.name,
-        "tags": tags,
-        "status": post.status,
-        "author": post.user.username,
-        "views": post.views,
-        "publishDate": post.publish_date.isoformat() if post.publish_date else None,
-        "updateTime": post.updated_at.isoformat(),
-        "coverImage": post.cover_image,
-        "commentCount": comment_count
-    }
+    # 待写入的阅读量不计入 ETag，因此使用弱 ETag
+    result = conditional_response(request, response, f"W/{etag}", result)
+    return direct_response(result, response) if selected else result
 
 @app.post("/api/posts", response_model=Post, tags=["文章"], summary="创建文章", description="创建新的博客文章")
-async def create_post(post: PostCreate, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_post(post: PostCreate, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     # 检查用户权限
     if "create_post" not in current_user.get("permissions", []):
         raise HTTPException(status_code=403, detail="没有创建文章的权限")
     
-    # 获取分类
-    category = db.query(Category).filter(Category.name == post.category).first()
-    if not category:
-        # 如果分类不存在，创建新分类
-        category = Category(name=post.category)
-        db.add(category)
-        db.commit()
-        db.refresh(category)
+    # 获取分类和标签，不存在时创建，与文章在同一事务中提交
+    category = get_or_create_by_name(db, Category, [post.category])[0]
+    tags = get_or_create_by_name(db, Tag, post.tags)
     
     # 创建新文章
     description = post.description or post.content[:100] + "..."
@@ -673,52 +1203,29 @@ async def create_post(post: PostCreate, current_user: dict = Depends(get_current
         description=description,
         author=current_user["id"],
         category_id=category.id,
-        status=post.status
+        status=post.status,
+        **post_renderer.render(post.content)
     )
     
     if post.status == "published":
         new_post.publish_date = datetime.now()
     
+    new_post.tags = tags
     db.add(new_post)
-    db.commit()
-    db.refresh(new_post)
-    
-    # 处理标签
-    for tag_name in post.tags:
-        tag = db.query(Tag).filter(Tag.name == tag_name).first()
-        if not tag:
-            # 如果标签不存在，创建新标签
-            tag = Tag(name=tag_name)
-            db.add(tag)
-            db.commit()
-            db.refresh(tag)
-        
-        # 添加文章-标签关联
-        new_post.tags.append(tag)
-    
+    db.flush()
+    post_id = new_post.id
     db.commit()
     
     # 返回API格式的文章
-    return {
-        "id": new_post.id,
-        "title": new_post.title,
-        "content": new_post.content,
-        "description": new_post.description,
-        "category": category.name,
-        "tags": post.tags,
-        "status": new_post.status,
-        "author": current_user["username"],
-        "views": new_post.views,
-        "publishDate": new_post.publish_date.isoformat() if new_post.publish_date else None,
-        "updateTime": new_post.updated_at.isoformat(),
-        "coverImage": new_post.cover_image,
-        "commentCount": 0
-    }
+    saved_post = post_query(db).filter(DBPost.id == post_id).one()
+    index_post(saved_post)
+    response_cache.invalidate("posts", f"post:{post_id}", "categories", "tags")
+    return serialize_post(db, saved_post)
 
 @app.put("/api/posts/{post_id}", response_model=Post, tags=["文章"], summary="更新文章", description="修改现有博客文章的内容")
-async def update_post(post_id: str, post: PostUpdate, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_post(post_id: str, post: PostUpdate, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     # 查找文章
-    db_post = db.query(DBPost).filter(DBPost.id == post_id).first()
+    db_post = post_query(db).filter(DBPost.id == post_id).first()
     if not db_post:
         raise HTTPException(status_code=404, detail="文章未找到")
     
@@ -729,17 +1236,15 @@ async def update_post(post_id: str, post: PostUpdate, current_user: dict = Depen
     if not (is_author and can_edit) and "manage_users" not in current_user.get("permissions", []):
         raise HTTPException(status_code=403, detail="没有权限更新此文章")
     
-    # 获取分类
-    category = db.query(Category).filter(Category.name == post.category).first()
-    if not category:
-        # 如果分类不存在，创建新分类
-        category = Category(name=post.category)
-        db.add(category)
-        db.commit()
-        db.refresh(category)
+    # 获取分类和标签，不存在时创建，与文章在同一事务中提交
+    category = get_or_create_by_name(db, Category, [post.category])[0]
+    tags = get_or_create_by_name(db, Tag, post.tags)
     
     # 更新文章
     db_post.title = post.title
+    if db_post.content != post.content or db_post.content_html is None:
+        for column, value in post_renderer.render(post.content).items():
+            setattr(db_post, column, value)
     db_post.content = post.content
     db_post.description = post.description or post.content[:100] + "..."
     db_post.category_id = category.id
@@ -750,48 +1255,19 @@ async def update_post(post_id: str, post: PostUpdate, current_user: dict = Depen
     
     db_post.status = post.status
     
-    # 更新标签
-    # 清除现有标签关联
-    db_post.tags.clear()
-    
-    # 添加新标签
-    for tag_name in post.tags:
-        tag = db.query(Tag).filter(Tag.name == tag_name).first()
-        if not tag:
-            # 如果标签不存在，创建新标签
-            tag = Tag(name=tag_name)
-            db.add(tag)
-            db.commit()
-            db.refresh(tag)
-        
-        # 添加文章-标签关联
-        db_post.tags.append(tag)
+    # 更新标签，只增删有变化的关联
+    db_post.tags = tags
     
     db.commit()
-    db.refresh(db_post)
-    
-    # 计算评论数
-    comment_count = db.query(DBComment).filter(DBComment.post_id == db_post.id).count()
     
     # 返回API格式的文章
-    return {
-        "id": db_post.id,
-        "title": db_post.title,
-        "content": db_post.content,
-        "description": db_post.description,
-        "category": category.name,
-        "tags": [tag.name for tag in db_post.tags],
-        "status": db_post.status,
-        "author": db_post.user.username,
-        "views": db_post.views,
-        "publishDate": db_post.publish_date.isoformat() if db_post.publish_date else None,
-        "updateTime": db_post.updated_at.isoformat(),
-        "coverImage": db_post.cover_image,
-        "commentCount": comment_count
-    }
+    saved_post = post_query(db).filter(DBPost.id == db_post.id).one()
+    index_post(saved_post)
+    response_cache.invalidate("posts", f"post:{post_id}", "categories", "tags")
+    return serialize_post(db, saved_post)
 
 @app.delete("/api/posts/{post_id}", tags=["文章"], summary="删除文章", description="删除指定的博客文章")
-async def delete_post(post_id: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_post(post_id: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     # 查找文章
     post = db.query(DBPost).filter(DBPost.id == post_id).first()
     if not post:
@@ -804,96 +1280,86 @@ async def delete_post(post_id: str, current_user: dict = Depends(get_current_use
     if not (is_author and can_delete) and "manage_users" not in current_user.get("permissions", []):
         raise HTTPException(status_code=403, detail="没有权限删除此文章")
     
-    # 删除相关评论
-    db.query(DBComment).filter(DBComment.post_id == post_id).delete()
+    # 删除相关评论、点赞和标签关联
+    comment_ids = [comment_id for comment_id, in db.query(DBComment.id).filter(DBComment.post_id == post_id)]
+    bulk_delete_comments(db, comment_ids)
+    db.query(PostLike).filter(PostLike.post_id == post_id).delete(synchronize_session=False)
+    db.execute(post_tags.delete().where(post_tags.c.post_id == post_id))
     
     # 删除文章
-    db.delete(post)
+    db.query(DBPost).filter(DBPost.id == post_id).delete(synchronize_session=False)
     db.commit()
+    search_index.remove(post_id)
+    response_cache.invalidate("posts", f"post:{post_id}", f"comments:{post_id}")
     
     return {"message": "文章删除成功"}
 
 # 点赞相关路由
-@app.post("/api/posts/{post_id}/like", tags=["文章"], summary="点赞文章", description="为指定文章添加点赞")
-async def like_post(post_id: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def like_state(db: Session, post_id: str, liked: bool):
+    """返回点赞接口的响应：最新点赞数和当前用户是否已点赞"""
+    post = db.query(DBPost.like_count).filter(DBPost.id == post_id).first()
+    if not post:
+        raise HTTPException(status_code=404, detail="文章未找到")
+    return {"liked": liked, "likes": post.like_count}
+
+@app.post("/api/posts/{post_id}/like", tags=["文章"], summary="点赞文章", description="为指定文章添加点赞，重复点赞不会报错")
+def like_post(post_id: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     # 检查用户权限
     if "like_post" not in current_user.get("permissions", []):
         raise HTTPException(status_code=403, detail="没有点赞权限")
     
-    # 检查文章是否存在
-    post = db.query(DBPost).filter(DBPost.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="文章未找到")
-    
-    # 检查用户是否已经点赞过
-    from database import PostLike
-    existing_like = db.query(PostLike).filter(
-        PostLike.post_id == post_id,
-        PostLike.user_id == current_user["id"]
-    ).first()
-    
-    if existing_like:
-        raise HTTPException(status_code=400, detail="已经点赞过该文章")
-    
-    # 创建新点赞
-    new_like = PostLike(
-        post_id=post_id,
-        user_id=current_user["id"]
+    # 依靠 (post_id, user_id) 唯一约束，已点赞时不插入
+    result = db.execute(
+        insert(PostLike).prefix_with("IGNORE", dialect="mysql").values(post_id=post_id, user_id=current_user["id"])
     )
-    
-    db.add(new_like)
+    if result.rowcount:
+        adjust_post_counters(db, post_id, likes=1)
+    state = like_state(db, post_id, True)
     db.commit()
+    if result.rowcount:
+        # 文章列表中也有点赞数，列表缓存同样失效
+        response_cache.invalidate("posts", f"post:{post_id}")
     
-    return {"message": "点赞成功"}
+    return dict(state, message="点赞成功")
 
-@app.delete("/api/posts/{post_id}/like", tags=["文章"], summary="取消点赞", description="取消对指定文章的点赞")
-async def unlike_post(post_id: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+@app.delete("/api/posts/{post_id}/like", tags=["文章"], summary="取消点赞", description="取消对指定文章的点赞，未点赞时不会报错")
+def unlike_post(post_id: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     # 检查用户权限
     if "like_post" not in current_user.get("permissions", []):
         raise HTTPException(status_code=403, detail="没有点赞权限")
     
-    # 检查文章是否存在
-    post = db.query(DBPost).filter(DBPost.id == post_id).first()
-    if not post:
-        raise HTTPException(status_code=404, detail="文章未找到")
-    
-    # 查找用户的点赞记录
-    from database import PostLike
-    like = db.query(PostLike).filter(
+    deleted = db.query(PostLike).filter(
         PostLike.post_id == post_id,
         PostLike.user_id == current_user["id"]
-    ).first()
-    
-    if not like:
-        raise HTTPException(status_code=404, detail="未找到点赞记录")
-    
-    # 删除点赞
-    db.delete(like)
+    ).delete(synchronize_session=False)
+    if deleted:
+        adjust_post_counters(db, post_id, likes=-1)
+    state = like_state(db, post_id, False)
     db.commit()
+    if deleted:
+        response_cache.invalidate("posts", f"post:{post_id}")
     
-    return {"message": "取消点赞成功"}
+    return dict(state, message="取消点赞成功")
 
 @app.get("/api/posts/{post_id}/likes", tags=["文章"], summary="获取文章点赞数", description="获取指定文章的点赞数量")
-async def get_post_likes(post_id: str, db: Session = Depends(get_db)):
-    # 检查文章是否存在
-    post = db.query(DBPost).filter(DBPost.id == post_id).first()
+def get_post_likes(post_id: str, db: Session = Depends(get_db)):
+    post = db.query(DBPost.like_count).filter(DBPost.id == post_id).first()
     if not post:
         raise HTTPException(status_code=404, detail="文章未找到")
     
-    # 获取点赞数
-    from database import PostLike
-    likes_count = db.query(PostLike).filter(PostLike.post_id == post_id).count()
-    
-    return {"likes": likes_count}
+    return {"likes": post.like_count}
 
 # 分类相关路由
+def load_categories(db: Session):
+    return [{"name": category.name} for category in db.query(Category).all()]
+
 @app.get("/api/categories", response_model=List[CategoryBase], tags=["分类"], summary="获取所有分类", description="获取博客系统中的所有文章分类")
-async def get_categories(db: Session = Depends(get_db)):
-    categories = db.query(Category).all()
-    return [{"name": category.name} for category in categories]
+def get_categories(request: Request, response: Response, db: Session = Depends(get_db)):
+    result, etag = cached_response(request, ("categories",), lambda: load_categories(db))
+    return conditional_response(request, response, etag, result)
 
 @app.post("/api/categories", response_model=CategoryBase, tags=["分类"], summary="创建分类", description="创建新的文章分类")
-async def create_category(category: CategoryBase, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_category(category: CategoryBase, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="只有管理员可以创建分类")
     
@@ -906,11 +1372,12 @@ async def create_category(category: CategoryBase, current_user: dict = Depends(g
     new_category = Category(name=category.name)
     db.add(new_category)
     db.commit()
+    response_cache.invalidate("categories")
     
     return {"name": category.name}
 
 @app.delete("/api/categories/{category_name}", tags=["分类"], summary="删除分类", description="删除指定的文章分类")
-async def delete_category(category_name: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_category(category_name: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="只有管理员可以删除分类")
     
@@ -927,17 +1394,21 @@ async def delete_category(category_name: str, current_user: dict = Depends(get_c
     # 删除分类
     db.delete(category)
     db.commit()
+    response_cache.invalidate("categories")
     
     return {"message": "分类删除成功"}
 
 # 标签相关路由
+def load_tags(db: Session):
+    return [{"name": tag.name} for tag in db.query(Tag).all()]
+
 @app.get("/api/tags", response_model=List[TagBase], tags=["标签"], summary="获取所有标签", description="获取博客系统中的所有文章标签")
-async def get_tags(db: Session = Depends(get_db)):
-    tags = db.query(Tag).all()
-    return [{"name": tag.name} for tag in tags]
+def get_tags(request: Request, response: Response, db: Session = Depends(get_db)):
+    result, etag = cached_response(request, ("tags",), lambda: load_tags(db))
+    return conditional_response(request, response, etag, result)
 
 @app.post("/api/tags", response_model=TagBase, tags=["标签"], summary="创建标签", description="创建新的文章标签")
-async def create_tag(tag: TagBase, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_tag(tag: TagBase, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     # 检查标签是否已存在
     existing = db.query(Tag).filter(Tag.name == tag.name).first()
     if existing:
@@ -947,11 +1418,12 @@ async def create_tag(tag: TagBase, current_user: dict = Depends(get_current_user
     new_tag = Tag(name=tag.name)
     db.add(new_tag)
     db.commit()
+    response_cache.invalidate("tags")
     
     return {"name": tag.name}
 
 @app.delete("/api/tags/{tag_name}", tags=["标签"], summary="删除标签", description="删除指定的文章标签")
-async def delete_tag(tag_name: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_tag(tag_name: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     if current_user["role"] != "admin":
         raise HTTPException(status_code=403, detail="只有管理员可以删除标签")
     
@@ -961,37 +1433,54 @@ async def delete_tag(tag_name: str, current_user: dict = Depends(get_current_use
         raise HTTPException(status_code=404, detail="标签未找到")
     
     # 从所有文章中移除此标签关联
+    post_ids = [post.id for post in tag.posts]
     tag.posts.clear()
     
     # 删除标签
     db.delete(tag)
     db.commit()
+    response_cache.invalidate("tags", "posts", *[f"post:{post_id}" for post_id in post_ids])
     
     return {"message": "标签删除成功"}
 
 # 文件上传相关路由
 @app.post("/api/upload", response_model=FileResponse, tags=["上传"], summary="上传文件", description="上传文件并返回文件路径")
-async def upload_file(file: UploadFile = File(...), current_user: dict = Depends(get_current_user)):
-    # 生成唯一文件名
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid4()}{file_extension}"
-    file_location = UPLOAD_DIR / unique_filename
-    
-    # 保存文件
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+def upload_file(background_tasks: BackgroundTasks, file: UploadFile = File(...), current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+    # 保存文件，相同内容只保存一份
+    stored_filename = save_upload(file, db)
+    image_variants.submit(stored_filename)
+    # 响应返回后生成 gzip / brotli 预压缩版本
+    background_tasks.add_task(write_compressed_sidecars, UPLOAD_DIR, stored_filename)
     
     # 返回文件路径
     return {
-        "filename": unique_filename,
-        "filepath": f"/uploads/{unique_filename}"
+        "filename": stored_filename,
+        "filepath": f"/uploads/{stored_filename}"
     }
 
+# 重新扫描上传目录，同步文件索引
+@app.post("/api/upload/reconcile", tags=["上传"], summary="重建上传文件索引")
+def reconcile_upload_files(background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(status_code=403, detail="权限不足")
+
+    def run():
+        db = SessionLocal()
+        try:
+            print(f"上传文件索引已同步: {reconcile_upload_index(db, UPLOAD_DIR)}")
+        except Exception as e:
+            print(f"同步上传文件索引错误: {e}")
+        finally:
+            db.close()
+
+    background_tasks.add_task(run)
+    return {"success": True, "msg": "已开始同步"}
+
 # 文章封面图片上传
 @app.post("/api/posts/{post_id}/cover", response_model=Post, tags=["文章"], summary="上传文章封面", description="为指定文章上传封面图片")
-async def upload_post_cover(post_id: str, file: UploadFile = File(...), current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def upload_post_cover(post_id: str, background_tasks: BackgroundTasks, file: UploadFile = File(...), current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     # 查找文章
-    post = db.query(DBPost).filter(DBPost.id == post_id).first()
+    post = post_query(db).filter(DBPost.id == post_id).first()
     if not post:
         raise HTTPException(status_code=404, detail="文章未找到")
     
@@ -1002,68 +1491,216 @@ async def upload_post_cover(post_id: str, file: UploadFile = File(...), current_
     if not (is_author and can_edit) and "manage_users" not in current_user.get("permissions", []):
         raise HTTPException(status_code=403, detail="没有权限更新此文章")
     
-    # 上传文件
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid4()}{file_extension}"
-    file_location = UPLOAD_DIR / unique_filename
-    
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    # 上传文件，封面只允许图片
+    stored_filename = save_upload(file, db, IMAGE_EXTENSIONS)
+    # 缩略图生成后刷新文章缓存，使响应包含 coverImageVariants
+    image_variants.submit(stored_filename, on_done=lambda _: response_cache.invalidate("posts", f"post:{post_id}"))
+    background_tasks.add_task(write_compressed_sidecars, UPLOAD_DIR, stored_filename)
     
     # 更新文章封面
-    post.cover_image = f"/uploads/{unique_filename}"
+    post.cover_image = f"/uploads/{stored_filename}"
     db.commit()
     
-    # 获取标签列表
-    tags = [tag.name for tag in post.tags]
-    
-    # 计算评论数
-    comment_count = db.query(DBComment).filter(DBComment.post_id == post.id).count()
-    
     # 返回API格式的文章
-    return {
-        "id": post.id,
-        "title": post.title,
-        "content": post.content,
-        "description": post.description,
-        "category": post.category.name,
-        "tags": tags,
-        "status": post.status,
-        "author": post.user.username,
-        "views": post.views,
-        "publishDate": post.publish_date.isoformat() if post.publish_date else None,
-        "updateTime": post.updated_at.isoformat(),
-        "coverImage": post.cover_image,
-        "commentCount": comment_count
-    }
+    saved_post = post_query(db).filter(DBPost.id == post_id).one()
+    # 封面不参与搜索，只同步更新时间，使启动时的索引指纹与数据库一致
+    search_index.touch(post_id, saved_post.updated_at.isoformat())
+    response_cache.invalidate("posts", f"post:{post_id}")
+    return serialize_post(db, saved_post)
 
 # 评论相关路由
+def load_comment_threads(db: Session, post_id: str):
+    """一次查询取出文章的全部评论（连同作者用户名），按顶层评论整理成线程
+
+    返回 {"nodes": {id: 评论}, "threads": [顶层评论id], "replies": {顶层评论id: [回复id]}}，
+    均按 (创建时间, id) 排序。结果按文章缓存，评论变化时通过 comments:{id} 标签失效，
+    不依赖 post:{id}（阅读量写入时也会让 post:{id} 失效）。
+    """
+    key = f"comments:{post_id}"
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached
+    versions = response_cache.versions((f"comments:{post_id}",))
+    rows = db.query(
+        DBComment.id, DBComment.content, DBComment.parent_id, DBComment.created_at, User.username
+    ).join(User, User.id == DBComment.author).filter(
+        DBComment.post_id == post_id
+    ).order_by(DBComment.created_at, DBComment.id).all()
+
+    nodes = {
+        row.id: {
+            "id": row.id,
+            "content": row.content,
+            "postId": post_id,
+            "author": row.username,
+            "createdAt": row.created_at.isoformat(),
+            "parentId": row.parent_id
+        }
+        for row in rows
+    }
+    roots = {}
+
+    def find_root(comment_id):
+        path = []
+        while comment_id not in roots:
+            parent_id = nodes[comment_id]["parentId"]
+            if parent_id not in nodes or parent_id in path:
+                # 顶层评论，或父评论已不存在
+                roots[comment_id] = comment_id
+                break
+            path.append(comment_id)
+            comment_id = parent_id
+        for child_id in path:
+            roots[child_id] = roots[comment_id]
+        return roots[comment_id]
+
+    threads = []
+    replies = {}
+    for row in rows:
+        root_id = find_root(row.id)
+        if root_id == row.id:
+            threads.append(row.id)
+        else:
+            replies.setdefault(root_id, []).append(row.id)
+
+    result = {"nodes": nodes, "threads": threads, "replies": replies}
+    # 按评论内容的 JSON 大小计入缓存的总字节数
+    response_cache.set(key, result, versions, len(json.dumps(nodes, ensure_ascii=False).encode()))
+    return result
+
+def encode_comment_cursor(comment: dict):
+    """将(createdAt, id)编码为不透明的分页游标"""
+    raw = json.dumps([comment["createdAt"], comment["id"]])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def comment_cursor_position(cursor: Optional[str], ids: List[str], nodes: dict):
+    """返回游标之后第一条评论在 ids 中的位置"""
+    if not cursor:
+        return 0
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, comment_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    # 格式正确但字段类型不对的游标，比较时会抛出 TypeError
+    if not isinstance(created_at, str) or not isinstance(comment_id, str):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    for index, current_id in enumerate(ids):
+        if current_id == comment_id:
+            return index + 1
+        if (nodes[current_id]["createdAt"], current_id) > (created_at, comment_id):
+            # 游标指向的评论已被删除
+            return index
+    return len(ids)
+
+def nest_comments(comment_ids: List[str], nodes: dict, attach_to: Optional[dict] = None):
+    """把按时间排序的评论组装成树，父评论不在本批中的评论作为顶层返回（或挂到 attach_to 下）"""
+    batch = {}
+    top = []
+    for comment_id in comment_ids:
+        node = dict(nodes[comment_id], replies=[])
+        batch[comment_id] = node
+        parent = batch.get(node["parentId"])
+        if parent is not None:
+            parent["replies"].append(node)
+        elif attach_to is not None:
+            attach_to["replies"].append(node)
+        else:
+            top.append(node)
+    return top
+
+COMMENT_DELETE_BATCH = 1000
+
+def comment_subtree_ids(db: Session, comment: DBComment):
+    """返回评论及其所有层级回复的 id
+
+    一次查询取出文章下所有评论的 (id, parent_id)，在内存中遍历子树。
+    """
+    children = {}
+    for comment_id, parent_id in db.query(DBComment.id, DBComment.parent_id).filter(DBComment.post_id == comment.post_id):
+        children.setdefault(parent_id, []).append(comment_id)
+    ids = [comment.id]
+    seen = {comment.id}
+    for current_id in ids:
+        for child_id in children.get(current_id, []):
+            if child_id not in seen:
+                seen.add(child_id)
+                ids.append(child_id)
+    return ids
+
+def bulk_delete_comments(db: Session, comment_ids: List[str]):
+    """按批删除评论，每批一条 DELETE 语句"""
+    for start in range(0, len(comment_ids), COMMENT_DELETE_BATCH):
+        db.query(DBComment).filter(
+            DBComment.id.in_(comment_ids[start:start + COMMENT_DELETE_BATCH])
+        ).delete(synchronize_session=False)
+
 @app.get("/api/posts/{post_id}/comments", response_model=List[Comment], tags=["评论"], summary="获取文章评论", description="获取指定文章的所有评论")
-async def get_post_comments(post_id: str, db: Session = Depends(get_db)):
-    # 检查文章是否存在
-    post = db.query(DBPost).filter(DBPost.id == post_id).first()
-    if not post:
+def get_post_comments(post_id: str, db: Session = Depends(get_db)):
+    comments = load_comment_threads(db, post_id)
+    # 没有评论时才需要确认文章是否存在
+    if not comments["nodes"] and not db.query(DBPost.id).filter(DBPost.id == post_id).first():
+        raise HTTPException(status_code=404, detail="文章未找到")
+    result = list(comments["nodes"].values())
+    return direct_response(result) if "comments" in FAST_JSON_ROUTES else result
+
+@app.get("/api/posts/{post_id}/comments/tree", response_model=CommentTreePage, tags=["评论"], summary="获取文章评论树", description="按顶层评论分页返回嵌套的评论树，每个线程最多返回 replies 条回复")
+def get_post_comment_tree(
+    post_id: str,
+    limit: int = Query(20, ge=1, le=100, description="每页顶层评论数"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 nextCursor"),
+    replies: int = Query(10, ge=0, le=100, description="每个线程返回的回复数"),
+    db: Session = Depends(get_db)
+):
+    comments = load_comment_threads(db, post_id)
+    if not comments["nodes"] and not db.query(DBPost.id).filter(DBPost.id == post_id).first():
         raise HTTPException(status_code=404, detail="文章未找到")
-    
-    # 获取评论
-    comments = db.query(DBComment).filter(DBComment.post_id == post_id).all()
-    
-    # 转换为API格式
-    result = []
-    for comment in comments:
-        result.append({
-            "id": comment.id,
-            "content": comment.content,
-            "postId": comment.post_id,
-            "author": comment.user.username,
-            "createdAt": comment.created_at.isoformat(),
-            "parentId": comment.parent_id
-        })
-    
-    return result
+
+    nodes = comments["nodes"]
+    threads = comments["threads"]
+    start = comment_cursor_position(cursor, threads, nodes)
+    page = threads[start:start + limit]
+    items = []
+    for root_id in page:
+        thread_replies = comments["replies"].get(root_id, [])
+        root = dict(nodes[root_id], replies=[], replyCount=len(thread_replies), repliesCursor=None)
+        shown = thread_replies[:replies]
+        nest_comments(shown, nodes, attach_to=root)
+        if len(thread_replies) > replies:
+            root["repliesCursor"] = encode_comment_cursor(nodes[shown[-1] if shown else root_id])
+        items.append(root)
+
+    next_cursor = None
+    if start + limit < len(threads):
+        next_cursor = encode_comment_cursor(nodes[page[-1]])
+    result = {"items": items, "totalThreads": len(threads), "nextCursor": next_cursor}
+    return direct_response(result) if "comments" in FAST_JSON_ROUTES else result
+
+@app.get("/api/comments/{comment_id}/replies", response_model=CommentRepliesPage, tags=["评论"], summary="获取更多回复", description="按 repliesCursor 继续获取线程中的回复")
+def get_comment_replies(
+    comment_id: str,
+    cursor: Optional[str] = Query(None, description="评论树返回的 repliesCursor 或上一页的 nextCursor"),
+    limit: int = Query(50, ge=1, le=200),
+    db: Session = Depends(get_db)
+):
+    comment = db.query(DBComment.post_id).filter(DBComment.id == comment_id).first()
+    if not comment:
+        raise HTTPException(status_code=404, detail="评论未找到")
+    comments = load_comment_threads(db, comment.post_id)
+    nodes = comments["nodes"]
+    # 线程按 [顶层评论, 回复...] 排列，游标可以指向顶层评论本身（还未返回任何回复）
+    thread = [comment_id] + comments["replies"].get(comment_id, [])
+    start = max(comment_cursor_position(cursor, thread, nodes), 1)
+    page = thread[start:start + limit]
+    next_cursor = None
+    if start + limit < len(thread):
+        next_cursor = encode_comment_cursor(nodes[page[-1]])
+    # 父评论已在之前返回的回复，作为顶层返回，客户端按 parentId 挂到对应位置
+    result = {"items": nest_comments(page, nodes), "nextCursor": next_cursor}
+    return direct_response(result) if "comments" in FAST_JSON_ROUTES else result
 
 @app.post("/api/comments", response_model=Comment, tags=["评论"], summary="创建评论", description="为指定文章创建新评论")
-async def create_comment(comment: CommentCreate, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def create_comment(comment: CommentCreate, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     # 检查用户权限
     if "comment_post" not in current_user.get("permissions", []):
         raise HTTPException(status_code=403, detail="没有评论权限")
@@ -1081,8 +1718,11 @@ async def create_comment(comment: CommentCreate, current_user: dict = Depends(ge
     )
     
     db.add(new_comment)
+    adjust_post_counters(db, comment.postId, comments=1)
     db.commit()
     db.refresh(new_comment)
+    # 文章列表中也有评论数，列表缓存同样失效
+    response_cache.invalidate("posts", f"post:{comment.postId}", f"comments:{comment.postId}")
     
     # 返回API格式的评论
     return {
@@ -1095,7 +1735,7 @@ async def create_comment(comment: CommentCreate, current_user: dict = Depends(ge
     }
 
 @app.post("/api/comments/{comment_id}/reply", response_model=Comment, tags=["评论"], summary="回复评论", description="回复指定的评论")
-async def reply_to_comment(comment_id: str, comment: CommentCreate, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def reply_to_comment(comment_id: str, comment: CommentCreate, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     # 检查父评论是否存在
     parent_comment = db.query(DBComment).filter(DBComment.id == comment_id).first()
     if not parent_comment:
@@ -1115,8 +1755,10 @@ async def reply_to_comment(comment_id: str, comment: CommentCreate, current_user
     )
     
     db.add(new_reply)
+    adjust_post_counters(db, comment.postId, comments=1)
     db.commit()
     db.refresh(new_reply)
+    response_cache.invalidate("posts", f"post:{comment.postId}", f"comments:{comment.postId}")
     
     # 返回API格式的评论
     return {
@@ -1129,7 +1771,7 @@ async def reply_to_comment(comment_id: str, comment: CommentCreate, current_user
     }
 
 @app.delete("/api/comments/{comment_id}", tags=["评论"], summary="删除评论", description="删除指定的评论")
-async def delete_comment(comment_id: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def delete_comment(comment_id: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     # 查找评论
     comment = db.query(DBComment).filter(DBComment.id == comment_id).first()
     if not comment:
@@ -1145,31 +1787,37 @@ async def delete_comment(comment_id: str, current_user: dict = Depends(get_curre
     # 获取文章ID用于后续操作
     post_id = comment.post_id
     
-    # 删除评论及其回复
-    # 先找出所有回复
-    replies = db.query(DBComment).filter(DBComment.parent_id == comment_id).all()
-    
-    # 删除回复
-    for reply in replies:
-        db.delete(reply)
-    
-    # 删除主评论
-    db.delete(comment)
+    # 删除评论及其所有层级的回复
+    comment_ids = comment_subtree_ids(db, comment)
+    bulk_delete_comments(db, comment_ids)
+    adjust_post_counters(db, post_id, comments=-len(comment_ids))
     db.commit()
+    response_cache.invalidate("posts", f"post:{post_id}", f"comments:{post_id}")
     
     return {"message": "评论删除成功"}
 
 # 搜索功能
-@app.get("/api/search", response_model=List[Post], tags=["搜索"], summary="搜索文章", description="根据关键词搜索文章")
-async def search_posts(q: str = Query(..., min_length=1), category: Optional[str] = None, tag: Optional[str] = None, db: Session = Depends(get_db)):
-    # 基础查询：只搜索已发布的文章
-    query = db.query(DBPost).filter(DBPost.status == "published")
+@app.get("/api/search", response_model=List[SearchResult], tags=["搜索"], summary="搜索文章", description="根据关键词搜索文章，按相关度排序并返回高亮片段")
+def search_posts(
+    response: Response,
+    q: str = Query(..., min_length=1),
+    category: Optional[str] = None,
+    tag: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=100, description="返回数量，不指定时返回全部结果"),
+    offset: int = Query(0, ge=0),
+    fields: Optional[str] = Query(None, description="只返回这些字段，逗号分隔，如 title,author,publishDate"),
+    db: Session = Depends(get_db)
+):
+    selected = parse_fields(fields, SearchResult)
+    
+    # 在倒排索引中检索标题和内容
+    ranked = search_index.search(q)
+    if not ranked:
+        response.headers["X-Total-Count"] = "0"
+        return []
     
-    # 搜索标题和内容
-    query = query.filter(
-        (DBPost.title.ilike(f"%{q}%")) | 
-        (DBPost.content.ilike(f"%{q}%"))
-    )
+    # 基础查询：只搜索已发布的文章
+    query = db.query(DBPost.id).filter(DBPost.status == "published", DBPost.id.in_([post_id for post_id, _ in ranked]))
     
     # 应用分类过滤器
     if category:
@@ -1179,39 +1827,40 @@ async def search_posts(q: str = Query(..., min_length=1), category: Optional[str
     if tag:
         query = query.join(DBPost.tags).filter(Tag.name == tag)
     
-    # 执行查询
-    db_posts = query.all()
+    allowed = {post_id for post_id, in query.all()}
+    matches = [(post_id, score) for post_id, score in ranked if post_id in allowed]
+    # 符合条件的结果总数，客户端据此判断是否还有下一页
+    response.headers["X-Total-Count"] = str(len(matches))
+    page = matches[offset:] if limit is None else matches[offset:offset + limit]
+    if not page:
+        return []
+    
+    # 高亮片段从正文中截取
+    load_fields = selected
+    if selected is not None and "highlight" in selected:
+        load_fields = selected + ["content"]
+    
+    # 按相关度顺序加载当前页的文章
+    db_posts = {post.id: post for post in post_query(db, load_fields).filter(DBPost.id.in_([post_id for post_id, _ in page])).all()}
+    page = [(post_id, score) for post_id, score in page if post_id in db_posts]
     
     # 转换为API模型
-    results = []
-    for post in db_posts:
-        # 获取标签列表
-        tags = [tag.name for tag in post.tags]
-        
-        # 计算评论数
-        comment_count = db.query(DBComment).filter(DBComment.post_id == post.id).count()
-        
-        results.append({
-            "id": post.id,
-            "title": post.title,
-            "content": post.content,
-            "description": post.description,
-            "category": post.category.name,
-            "tags": tags,
-            "status": post.status,
-            "author": post.user.username,
-            "views": post.views,
-            "publishDate": post.publish_date.isoformat() if post.publish_date else None,
-            "updateTime": post.updated_at.isoformat(),
-            "coverImage": post.cover_image,
-            "commentCount": comment_count
-        })
-    
-    return results
+    terms = tokenize(q, for_query=True)
+    results = serialize_posts(db, [db_posts[post_id] for post_id, _ in page], fields=load_fields)
+    for item, (post_id, score) in zip(results, page):
+        if selected is None or "score" in selected:
+            item["score"] = score
+        if selected is None or "highlight" in selected:
+            item["highlight"] = highlight(item["content"], terms)
+        if selected is not None and "content" not in selected:
+            item.pop("content", None)
+    if selected is None and "search" not in FAST_JSON_ROUTES:
+        return results
+    return direct_response(results, response)
 
 # 用户权限管理
 @app.put("/api/users/{username}/role", tags=["用户"], summary="更新用户角色", description="修改指定用户的角色权限")
-async def update_user_role(username: str, role: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
+def update_user_role(username: str, role: str, current_user: dict = Depends(get_current_user), db: Session = Depends(get_db)):
     # 检查管理员权限
     if "manage_users" not in current_user.get("permissions", []):
         raise HTTPException(status_code=403, detail="没有权限管理用户")
@@ -1227,13 +1876,19 @@ async def update_user_role(username: str, role: str, current_user: dict = Depend
     # 更新用户角色
     user.role = role
     db.commit()
+    user_cache.invalidate(f"user:{username}")
     
     return {"message": f"用户角色已更新为 {role}"}
 
+# 配置线程池
+@app.on_event("startup")
+async def configure_threadpool():
+    anyio.to_thread.current_default_thread_limiter().total_tokens = THREADPOOL_SIZE
+
 # 初始化数据库
 @app.on_event("startup")
 async def init_db():
-    from database import create_tables, SessionLocal, User, Category, Tag
+    from database import create_tables, User, Category, Tag
     import os
     
     # 创建数据库表
@@ -1274,6 +1929,62 @@ async def init_db():
     finally:
         db.close()
 
+# 启动时加载或重建搜索索引
+def build_search_index():
+    db = SessionLocal()
+    try:
+        published = db.query(DBPost).filter(DBPost.status == "published")
+        count, latest = published.with_entities(func.count(DBPost.id), func.max(DBPost.updated_at)).one()
+        rows = published.with_entities(DBPost.id, DBPost.title, DBPost.content, DBPost.updated_at).yield_per(500)
+        search_index.load_or_build(
+            (count, latest.isoformat() if latest else None),
+            lambda: ((post_id, title, content, updated_at.isoformat()) for post_id, title, content, updated_at in rows)
+        )
+    finally:
+        db.close()
+
+@app.on_event("startup")
+async def init_search_index():
+    try:
+        await run_in_threadpool(build_search_index)
+    except Exception as e:
+        print(f"构建搜索索引错误: {e}")
+
+# 阅读量定期写入
+async def flush_view_counts_periodically():
+    while True:
+        await asyncio.sleep(VIEW_FLUSH_INTERVAL)
+        try:
+            flushed = await run_in_threadpool(view_counter.flush, SessionLocal)
+            # 已写入数据库的阅读量不再计入待写入增量，需要刷新文章详情缓存
+            response_cache.invalidate(*[f"post:{post_id}" for post_id in flushed])
+        except Exception as e:
+            print(f"写入阅读量错误: {e}")
+
+@app.on_event("startup")
+async def start_view_counter():
+    app.state.view_flush_task = asyncio.create_task(flush_view_counts_periodically())
+
+@app.on_event("shutdown")
+async def stop_password_hasher():
+    await run_in_threadpool(password_hasher.shutdown)
+
+@app.on_event("shutdown")
+async def stop_image_variants():
+    image_variants.shutdown()
+
+@app.on_event("shutdown")
+async def stop_post_renderer():
+    await run_in_threadpool(post_renderer.shutdown)
+
+@app.on_event("shutdown")
+async def stop_view_counter():
+    app.state.view_flush_task.cancel()
+    try:
+        await run_in_threadpool(view_counter.flush, SessionLocal)
+    except Exception as e:
+        print(f"写入阅读量错误: {e}")
+
 # 启动服务器
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,123 @@
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from passlib.context import CryptContext
+
+# 密码哈希
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
+class PasswordHasherBusy(Exception):
+    """排队的哈希任务已达上限"""
+
+
+def _verify(plain_password, hashed_password):
+    start = time.perf_counter()
+    return pwd_context.verify(plain_password, hashed_password), time.perf_counter() - start
+
+
+def _hash(password):
+    start = time.perf_counter()
+    return pwd_context.hash(password), time.perf_counter() - start
+
+
+class PasswordHasher:
+    """在独立的进程池（或线程池）中执行 bcrypt
+
+    bcrypt 每次耗时上百毫秒，放在请求线程池里执行时，登录高峰会占满所有线程，
+    导致其他页面请求排队。这里限制同时执行的数量为 workers，排队的任务超过
+    max_pending 时直接拒绝。工作进程异常退出（如被 OOM 终止）导致进程池不可用时，
+    重新创建进程池并重试一次。
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 16, use_processes: bool = True):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.use_processes = use_processes
+        self._executor = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.wait_time_total = 0.0
+        self.wait_time_max = 0.0
+        self.run_time_total = 0.0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.use_processes:
+                    # spawn 只导入本模块，不会复制主进程中的数据库连接
+                    self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+                else:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="password-hasher")
+            return self._executor
+
+    def _reset_executor(self, executor):
+        """丢弃已损坏的进程池，其他线程已经重新创建时不处理"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _submit(self, fn, *args):
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                return executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                self._reset_executor(executor)
+                if attempt:
+                    raise
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHasherBusy()
+        with self._lock:
+            self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            result, run_time = self._submit(fn, *args)
+        finally:
+            with self._lock:
+                self.pending -= 1
+            self._slots.release()
+        wait = max(time.perf_counter() - submitted - run_time, 0.0)
+        with self._lock:
+            self.completed += 1
+            self.wait_time_total += wait
+            self.wait_time_max = max(self.wait_time_max, wait)
+            self.run_time_total += run_time
+        return result
+
+    def verify(self, plain_password, hashed_password):
+        return self._run(_verify, plain_password, hashed_password)
+
+    def hash(self, password):
+        return self._run(_hash, password)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "maxPending": self.max_pending,
+                "executor": "process" if self.use_processes else "thread",
+                "inFlight": self.pending,
+                "queued": max(self.pending - self.workers, 0),
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "queueWaitAvgMs": self.wait_time_total / self.completed * 1000 if self.completed else 0.0,
+                "queueWaitMaxMs": self.wait_time_max * 1000,
+                "hashTimeAvgMs": self.run_time_total / self.completed * 1000 if self.completed else 0.0
+            }
@@ -0,0 +1,44 @@
+from sqlalchemy import text, bindparam
+from database import Post
+
+REPAIR_STATEMENT = text(
+    "UPDATE posts SET "
+    "comment_count = (SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id), "
+    "like_count = (SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = posts.id), "
+    "updated_at = updated_at "
+    "WHERE id IN :ids"
+).bindparams(bindparam("ids", expanding=True))
+
+
+def adjust_post_counters(db, post_id: str, comments: int = 0, likes: int = 0):
+    """在当前事务中调整文章的评论数和点赞数，不修改 updated_at"""
+    values = {Post.updated_at: Post.updated_at}
+    if comments:
+        values[Post.comment_count] = Post.comment_count + comments
+    if likes:
+        values[Post.like_count] = Post.like_count + likes
+    db.query(Post).filter(Post.id == post_id).update(values, synchronize_session=False)
+
+
+def repair_post_counters(db, batch_size: int = 500):
+    """按批重新统计所有文章的评论数和点赞数，每批一条 UPDATE 并单独提交"""
+    repaired = 0
+    last_id = ""
+    while True:
+        ids = [post_id for post_id, in db.query(Post.id).filter(Post.id > last_id).order_by(Post.id).limit(batch_size)]
+        if not ids:
+            break
+        db.execute(REPAIR_STATEMENT, {"ids": ids})
+        db.commit()
+        repaired += len(ids)
+        last_id = ids[-1]
+    return repaired
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    session = SessionLocal()
+    try:
+        print(f"已重新统计 {repair_post_counters(session)} 篇文章")
+    finally:
+        session.close()
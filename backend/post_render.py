@@ -0,0 +1,242 @@
+import re
+import sys
+import html
+import math
+import threading
+import multiprocessing
+from html.parser import HTMLParser
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+try:
+    import markdown
+except ImportError:  # 未安装 markdown 时不保存渲染结果，安装后由 backfill 补全
+    markdown = None
+
+EXCERPT_LENGTH = 200
+# 阅读速度：英文每分钟单词数，中文每分钟字数
+WORDS_PER_MINUTE = 200
+CJK_CHARS_PER_MINUTE = 400
+
+LATIN_WORD_PATTERN = re.compile(r"[A-Za-z0-9]+(?:['’-][A-Za-z0-9]+)*")
+CJK_CHAR_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+URL_SCHEME_PATTERN = re.compile(r"^([a-z][a-z0-9+.-]*):")
+
+ALLOWED_TAGS = {
+    "a", "abbr", "b", "blockquote", "br", "code", "del", "em", "h1", "h2", "h3", "h4", "h5", "h6",
+    "hr", "i", "img", "kbd", "li", "ol", "p", "pre", "s", "strong", "sub", "sup",
+    "table", "tbody", "td", "th", "thead", "tr", "ul"
+}
+ALLOWED_ATTRIBUTES = {
+    "a": {"href", "title"},
+    "abbr": {"title"},
+    "img": {"src", "alt", "title", "width", "height"},
+    "code": {"class"},
+    "td": {"align"},
+    "th": {"align"}
+}
+URL_ATTRIBUTES = {"href", "src"}
+ALLOWED_URL_SCHEMES = {"http", "https", "mailto"}
+# 连同内容一起删除的标签
+DROP_CONTENT_TAGS = {"script", "style", "iframe", "object", "embed", "template", "textarea", "noscript"}
+VOID_TAGS = {"br", "hr", "img"}
+# 提取纯文本时，这些标签前后加空格，避免相邻段落的文字连在一起
+BLOCK_TAGS = {"p", "br", "li", "blockquote", "pre", "h1", "h2", "h3", "h4", "h5", "h6", "td", "th", "tr", "hr"}
+
+
+def is_safe_url(url: str):
+    """只允许相对地址和 http / https / mailto 协议"""
+    normalized = re.sub(r"[\x00-\x20]", "", url).lower()
+    match = URL_SCHEME_PATTERN.match(normalized)
+    return match is None or match.group(1) in ALLOWED_URL_SCHEMES
+
+
+class HTMLSanitizer(HTMLParser):
+    """按白名单过滤 HTML，同时提取纯文本
+
+    不在白名单中的标签被去掉但保留其中的文字，script、style 等标签连同内容一起删除，
+    属性只保留白名单中的，链接和图片地址只允许安全的协议。
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.output = []
+        self.text = []
+        self._open = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self._skip += 1
+            return
+        if self._skip:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        if tag not in ALLOWED_TAGS:
+            return
+        allowed = ALLOWED_ATTRIBUTES.get(tag, set())
+        parts = [tag]
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRIBUTES and not is_safe_url(value):
+                continue
+            parts.append(f'{name}="{html.escape(value)}"')
+        if tag == "a":
+            parts.append('rel="nofollow noopener"')
+        self.output.append(f"<{' '.join(parts)}>")
+        if tag not in VOID_TAGS:
+            self._open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag in DROP_CONTENT_TAGS:
+            self._skip -= 1
+        elif tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self._skip = max(self._skip - 1, 0)
+            return
+        if self._skip:
+            return
+        if tag in BLOCK_TAGS:
+            self.text.append(" ")
+        if tag not in self._open:
+            return
+        while self._open:
+            current = self._open.pop()
+            self.output.append(f"</{current}>")
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if self._skip:
+            return
+        self.text.append(data)
+        self.output.append(html.escape(data, quote=False))
+
+    def close(self):
+        super().close()
+        while self._open:
+            self.output.append(f"</{self._open.pop()}>")
+
+
+def markdown_to_html(content: str):
+    if markdown is not None:
+        return markdown.markdown(content, extensions=["fenced_code", "tables"], output_format="html")
+    # 只用于提取摘要和字数，不作为 content_html 保存
+    paragraphs = re.split(r"\n\s*\n", content.strip())
+    return "".join(
+        "<p>" + html.escape(paragraph).replace("\n", "<br>") + "</p>"
+        for paragraph in paragraphs if paragraph.strip()
+    )
+
+
+def render_post(content: str):
+    """渲染文章正文，返回 posts 表对应列的值
+
+    content_html 为过滤后的 HTML，excerpt 为纯文本摘要，word_count 为字数
+    （中文按字、英文按单词计），reading_time 为预计阅读分钟数。大文档在进程池中执行。
+    未安装 markdown 包时 content_html 为 None 并输出错误，摘要和字数按纯文本段落估算，
+    安装后运行 backfill 补全。
+    """
+    if markdown is None:
+        print("渲染文章错误: 未安装 markdown 包，content_html 留空，安装后运行 post_render.py 补全")
+    sanitizer = HTMLSanitizer()
+    sanitizer.feed(markdown_to_html(content or ""))
+    sanitizer.close()
+
+    text = re.sub(r"\s+", " ", "".join(sanitizer.text)).strip()
+    excerpt = text if len(text) <= EXCERPT_LENGTH else text[:EXCERPT_LENGTH].rstrip() + "..."
+    latin_words = len(LATIN_WORD_PATTERN.findall(text))
+    cjk_chars = len(CJK_CHAR_PATTERN.findall(text))
+    word_count = latin_words + cjk_chars
+    reading_time = max(1, math.ceil(latin_words / WORDS_PER_MINUTE + cjk_chars / CJK_CHARS_PER_MINUTE)) if word_count else 0
+    return {
+        "content_html": "".join(sanitizer.output) if markdown is not None else None,
+        "excerpt": excerpt,
+        "word_count": word_count,
+        "reading_time": reading_time
+    }
+
+
+class PostRenderer:
+    """渲染文章正文，超过 threshold 个字符的文档交给进程池，避免长时间占用 GIL
+
+    工作进程异常退出导致进程池不可用时，重新创建进程池并重试一次。
+    """
+
+    def __init__(self, workers: int = 1, threshold: int = 50000):
+        self.workers = workers
+        self.threshold = threshold
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn 只导入本模块，不会复制主进程中的数据库连接
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _reset_executor(self, executor):
+        """丢弃已损坏的进程池，其他线程已经重新创建时不处理"""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def render(self, content: str):
+        if len(content or "") < self.threshold:
+            return render_post(content)
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                return executor.submit(render_post, content).result()
+            except BrokenProcessPool:
+                self._reset_executor(executor)
+                if attempt:
+                    raise
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+
+def backfill_rendered_posts(db, renderer: PostRenderer, rerender_all: bool = False, batch_size: int = 100):
+    """为还没有渲染结果的文章（rerender_all 时为全部文章）生成 HTML、摘要和字数，每批提交一次"""
+    from database import Post
+    rendered = 0
+    last_id = ""
+    while True:
+        query = db.query(Post.id, Post.content).filter(Post.id > last_id)
+        if not rerender_all:
+            query = query.filter(Post.content_html.is_(None))
+        rows = query.order_by(Post.id).limit(batch_size).all()
+        if not rows:
+            break
+        for post_id, content in rows:
+            values = {getattr(Post, column): value for column, value in renderer.render(content).items()}
+            values[Post.updated_at] = Post.updated_at
+            db.query(Post).filter(Post.id == post_id).update(values, synchronize_session=False)
+        db.commit()
+        rendered += len(rows)
+        last_id = rows[-1].id
+    return rendered
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    renderer = PostRenderer()
+    session = SessionLocal()
+    try:
+        count = backfill_rendered_posts(session, renderer, rerender_all="--all" in sys.argv[1:])
+        print(f"已渲染 {count} 篇文章")
+    finally:
+        session.close()
+        renderer.shutdown()
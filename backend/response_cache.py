@@ -0,0 +1,116 @@
+import time
+import sqlite3
+import threading
+from typing import Optional
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """公开读接口的响应缓存，LRU + TTL，按条数和总字节数淘汰
+
+    每个缓存项带有依赖标签（如 "posts"、"categories"），写接口通过
+    invalidate() 让相关标签的缓存失效。标签版本号保存在本地 SQLite 文件中，
+    同一台机器上的多个 worker 共享，因此一个 worker 中的写操作也会让其他
+    worker 的缓存失效。
+
+    缓存项的大小由调用方在 set() 时给出（如响应 JSON 的字节数），max_bytes 为 None 时只按条数淘汰。
+    """
+
+    def __init__(self, path: str, max_entries: int = 1000, ttl: float = 60, max_bytes: Optional[int] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS tag_versions ("
+            "tag TEXT PRIMARY KEY, "
+            "version INTEGER NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            self._local.conn = conn
+        return conn
+
+    def versions(self, tags):
+        """读取标签当前版本号，计算缓存值之前调用，避免缓存计算期间被修改的数据"""
+        tags = tuple(tags)
+        if not tags:
+            return {}
+        rows = self._conn().execute(
+            f"SELECT tag, version FROM tag_versions WHERE tag IN ({','.join('?' * len(tags))})",
+            tags
+        ).fetchall()
+        current = dict(rows)
+        return {tag: current.get(tag, 0) for tag in tags}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None:
+            value, versions, expires_at, _ = entry
+            if expires_at > time.monotonic() and self.versions(versions) == versions:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                    self.hits += 1
+                return value
+            with self._lock:
+                self._discard(key)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def _discard(self, key):
+        """删除缓存项，调用时需持有 self._lock"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[3]
+        return entry
+
+    def set(self, key, value, versions, size: int = 0):
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (value, versions, time.monotonic() + self.ttl, size)
+            self.size += size
+            while len(self._entries) > self.max_entries or (self.max_bytes is not None and self.size > self.max_bytes):
+                self._discard(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, *tags):
+        """让依赖这些标签的缓存失效"""
+        conn = self._conn()
+        for tag in tags:
+            conn.execute(
+                "INSERT INTO tag_versions (tag, version) VALUES (?, 1) "
+                "ON CONFLICT(tag) DO UPDATE SET version = version + 1",
+                (tag,)
+            )
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "maxEntries": self.max_entries,
+                "bytes": self.size,
+                "maxBytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hitRate": self.hits / total if total else 0.0
+            }
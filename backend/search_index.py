@@ -0,0 +1,212 @@
+import re
+import html
+import math
+import sqlite3
+import threading
+from collections import Counter
+
+INDEX_VERSION = 2
+TITLE_BOOST = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# 拉丁字母/数字组成的单词，或连续的中日韩字符
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+
+
+def is_cjk(token: str):
+    return not token[0].isascii()
+
+
+def tokenize(text: str, for_query: bool = False):
+    """分词：拉丁文按单词切分，中文按相邻两字切分
+
+    建索引时中文同时收录单字，便于单字查询；查询时只在中文片段只有一个字时使用单字。
+    """
+    tokens = []
+    for match in TOKEN_PATTERN.finditer((text or "").lower()):
+        word = match.group()
+        if not is_cjk(word):
+            tokens.append(word)
+            continue
+        if len(word) == 1:
+            tokens.append(word)
+            continue
+        tokens.extend(word[i:i + 2] for i in range(len(word) - 1))
+        if not for_query:
+            tokens.extend(word)
+    return tokens
+
+
+def highlight(text: str, terms, width: int = 160):
+    """截取包含查询词的片段，并用 <mark> 标记命中位置"""
+    text = re.sub(r"\s+", " ", text or "").strip()
+    if not terms:
+        return html.escape(text[:width])
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(set(terms), key=len, reverse=True)), re.IGNORECASE)
+    first = pattern.search(text)
+    start = max(0, first.start() - width // 3) if first else 0
+    snippet = text[start:start + width]
+
+    parts = []
+    last = 0
+    for match in pattern.finditer(snippet):
+        parts.append(html.escape(snippet[last:match.start()]))
+        parts.append(f"<mark>{html.escape(match.group())}</mark>")
+        last = match.end()
+    parts.append(html.escape(snippet[last:]))
+    prefix = "..." if start > 0 else ""
+    suffix = "..." if start + width < len(text) else ""
+    return prefix + "".join(parts) + suffix
+
+
+class SearchIndex:
+    """已发布文章的倒排索引，使用 BM25 排序
+
+    索引保存在本地 SQLite 文件中，同一台机器上的多个 worker 共享：
+    修改一篇文章只删除并写入这篇文章的倒排记录，查询时只读取查询词的倒排记录，
+    不需要在内存中保存整个索引，也不需要在其他 worker 修改后重新加载。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        self._transaction(self._create_tables)
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            # 索引可以从数据库重建，不需要每次提交都同步到磁盘
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self, apply):
+        """在写事务中执行 apply(conn)，BEGIN IMMEDIATE 使多个 worker 的修改串行执行"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = apply(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return result
+
+    def _create_tables(self, conn):
+        if conn.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+            # 格式变化时丢弃旧索引，启动时从数据库重建
+            conn.execute("DROP TABLE IF EXISTS postings")
+            conn.execute("DROP TABLE IF EXISTS docs")
+            conn.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs ("
+            "post_id TEXT PRIMARY KEY, "
+            "length INTEGER NOT NULL, "
+            "updated_at TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS postings ("
+            "term TEXT NOT NULL, "
+            "post_id TEXT NOT NULL, "
+            "tf INTEGER NOT NULL, "
+            "PRIMARY KEY (term, post_id)) WITHOUT ROWID"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS postings_post_id ON postings (post_id)")
+
+    def _fingerprint(self, conn):
+        return tuple(conn.execute("SELECT COUNT(*), MAX(updated_at) FROM docs").fetchone())
+
+    def fingerprint(self):
+        """索引内容的指纹：(文章数, 最新更新时间)，用于判断是否需要重建"""
+        return self._fingerprint(self._conn())
+
+    def load_or_build(self, expected_fingerprint, load_posts):
+        """索引与数据库一致时直接使用，否则调用 load_posts() 重新构建"""
+        if self.fingerprint() == expected_fingerprint:
+            return False
+
+        def rebuild(conn):
+            # 其他 worker 可能已经重建完成
+            if self._fingerprint(conn) == expected_fingerprint:
+                return False
+            conn.execute("DELETE FROM postings")
+            conn.execute("DELETE FROM docs")
+            for post_id, title, content, updated_at in load_posts():
+                self._add(conn, post_id, title, content, updated_at)
+            return True
+
+        return self._transaction(rebuild)
+
+    # 索引维护
+
+    def _add(self, conn, post_id, title, content, updated_at):
+        self._remove(conn, post_id)
+        counts = Counter(tokenize(content))
+        for token in tokenize(title):
+            counts[token] += TITLE_BOOST
+        conn.execute(
+            "INSERT INTO docs (post_id, length, updated_at) VALUES (?, ?, ?)",
+            (post_id, sum(counts.values()), updated_at)
+        )
+        conn.executemany(
+            "INSERT INTO postings (term, post_id, tf) VALUES (?, ?, ?)",
+            [(token, post_id, tf) for token, tf in counts.items()]
+        )
+
+    def _remove(self, conn, post_id):
+        conn.execute("DELETE FROM postings WHERE post_id = ?", (post_id,))
+        conn.execute("DELETE FROM docs WHERE post_id = ?", (post_id,))
+
+    def add(self, post_id, title, content, updated_at):
+        self._transaction(lambda conn: self._add(conn, post_id, title, content, updated_at))
+
+    def remove(self, post_id):
+        self._transaction(lambda conn: self._remove(conn, post_id))
+
+    def touch(self, post_id, updated_at):
+        """只更新文章的更新时间（如更换封面），标题和正文没有变化，不重建倒排记录"""
+        self._transaction(lambda conn: conn.execute("UPDATE docs SET updated_at = ? WHERE post_id = ?", (updated_at, post_id)))
+
+    # 查询
+
+    def search(self, q: str):
+        """返回同时包含所有查询词的文章，按 BM25 得分降序排列 [(post_id, score)]"""
+        terms = list(dict.fromkeys(tokenize(q, for_query=True)))
+        if not terms:
+            return []
+        conn = self._conn()
+        # 在同一个读事务中读取，避免其他 worker 的修改使统计和倒排记录不一致
+        conn.execute("BEGIN")
+        try:
+            n_docs, total_length = conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM docs").fetchone()
+            postings = []
+            for term in terms:
+                # post_id -> (词频, 文档长度)
+                posting = {
+                    post_id: (tf, length)
+                    for post_id, tf, length in conn.execute(
+                        "SELECT p.post_id, p.tf, d.length FROM postings p JOIN docs d ON d.post_id = p.post_id "
+                        "WHERE p.term = ?",
+                        (term,)
+                    )
+                }
+                if not posting:
+                    return []
+                postings.append(posting)
+        finally:
+            conn.execute("COMMIT")
+        avg_length = total_length / n_docs if n_docs else 0
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        scores = {}
+        for posting in postings:
+            idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+            for post_id in candidates:
+                tf, length = posting[post_id]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length)
+                scores[post_id] = scores.get(post_id, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,243 @@
+import os
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import defer
+import fast_json
+import main
+from database import SessionLocal, Post as DBPost
+
+MANIFEST_NAME = ".manifest.json"
+PAGES_PREFIX = "api/posts/page/"
+PAGES_INDEX = "api/posts/pages.json"
+# 每个任务渲染的文章数
+POSTS_PER_JOB = 50
+# 一次从 ResponseCache 读取的标签数，不超过 SQLite 的参数个数限制
+VERSION_BATCH = 500
+
+# 除文章外的公开读接口：文件路径 -> (依赖的缓存标签, 加载函数)
+ENDPOINTS = {
+    "api/categories.json": ("categories", main.load_categories),
+    "api/tags.json": ("tags", main.load_tags),
+    "api/settings/basic.json": ("settings:basic", lambda db: main.load_settings(db, "basic", main.BasicSettingsModel)),
+    "api/settings/profile.json": ("settings:profile", lambda db: main.load_settings(db, "profile", main.ProfileSettingsModel)),
+    "api/settings/advanced.json": ("settings:advanced", lambda db: main.load_settings(db, "advanced", main.AdvancedSettingsModel)),
+    "api/friend-links.json": ("friend_links", main.load_friend_links)
+}
+
+
+def post_path(post_id: str):
+    return f"api/posts/{post_id}.json"
+
+
+def render_endpoints(db, paths):
+    """逐个渲染接口，一个接口出错不影响其他接口；出错的接口不在返回结果中"""
+    output = {}
+    for path in paths:
+        try:
+            output[path] = fast_json.dumps(jsonable_encoder(ENDPOINTS[path][1](db)))
+        except Exception as e:
+            db.rollback()
+            print(f"生成快照错误 {path}: {e}")
+    return output
+
+
+def render_pages(db, page_size: int):
+    """按 GET /api/posts?status=published&summary=true 的顺序输出摘要分页，以及分页信息"""
+    query = main.post_query(db).options(defer(DBPost.content)).filter(DBPost.status == "published")
+    posts = main.serialize_posts(db, main.apply_post_cursor(query, None).all(), summary=True)
+    pages = [posts[start:start + page_size] for start in range(0, len(posts), page_size)] or [[]]
+    files = {f"{PAGES_PREFIX}{number}.json": fast_json.dumps(page) for number, page in enumerate(pages, 1)}
+    files[PAGES_INDEX] = fast_json.dumps({"total": len(posts), "pageSize": page_size, "pages": len(pages)})
+    return files
+
+
+def render_posts(db, post_ids):
+    """与 GET /api/posts/{post_id} 相同的内容，不包含尚未写入数据库的阅读量"""
+    posts = main.post_query(db).filter(DBPost.id.in_(post_ids), DBPost.status == "published").all()
+    return {post_path(item["id"]): fast_json.dumps(item) for item in main.serialize_posts(db, posts)}
+
+
+def render_job(kind: str, arg):
+    """在工作进程中执行，每个任务使用独立的数据库会话，返回 {相对路径: 文件内容}"""
+    db = SessionLocal()
+    try:
+        if kind == "endpoints":
+            return render_endpoints(db, arg)
+        if kind == "pages":
+            return render_pages(db, arg)
+        return render_posts(db, arg)
+    finally:
+        db.close()
+
+
+class SnapshotExporter:
+    """把公开读接口的 JSON 响应导出为静态目录，供 CDN 直接提供
+
+    目录结构与接口路径对应：api/posts/page/{n}.json（已发布文章的摘要分页）、
+    api/posts/pages.json、api/posts/{id}.json、api/categories.json、api/tags.json、
+    api/settings/{basic,profile,advanced}.json、api/friend-links.json。
+
+    增量构建依赖 ResponseCache 的标签版本号：写接口调用 invalidate() 时版本号递增。
+    manifest 记录上次构建时各标签的版本号和每个文件的哈希，只重新生成版本号变化的文件，
+    内容没有变化的文件不重写。任务在 spawn 进程池中并行执行。
+    """
+
+    def __init__(self, output_dir, workers: int = 1, page_size: int = 10):
+        self.output_dir = Path(output_dir)
+        self.workers = workers
+        self.page_size = page_size
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            # spawn 的工作进程只导入本模块和 main，各自创建数据库连接
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def load_manifest(self):
+        try:
+            with open(self.output_dir / MANIFEST_NAME, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"pageSize": None, "versions": {}, "files": {}}
+
+    def save_manifest(self, manifest):
+        self._write(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, sort_keys=True).encode("utf-8"))
+
+    def current_versions(self, tags):
+        tags = list(tags)
+        versions = {}
+        for start in range(0, len(tags), VERSION_BATCH):
+            versions.update(main.response_cache.versions(tags[start:start + VERSION_BATCH]))
+        return versions
+
+    def _write(self, path: str, body: bytes):
+        target = self.output_dir / path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.tmp")
+        tmp.write_bytes(body)
+        os.replace(tmp, target)
+
+    def _remove(self, path: str):
+        try:
+            (self.output_dir / path).unlink()
+        except FileNotFoundError:
+            pass
+
+    def plan(self, manifest, versions, published, full: bool = False):
+        """根据标签版本号的变化决定需要重新生成的任务"""
+        old = {} if full else manifest["versions"]
+        changed = {tag for tag, version in versions.items() if old.get(tag) != version}
+        removed = {tag[len("post:"):] for tag in manifest["versions"] if tag.startswith("post:")} - set(published)
+
+        jobs = []
+        paths = [path for path, (tag, _) in ENDPOINTS.items() if tag in changed]
+        if paths:
+            jobs.append(("endpoints", paths))
+        changed_posts = [post_id for post_id in published if f"post:{post_id}" in changed]
+        # 摘要中包含评论数、点赞数和阅读量，任意一篇文章变化都需要重新分页
+        if "posts" in changed or changed_posts or removed or manifest["pageSize"] != self.page_size:
+            jobs.append(("pages", self.page_size))
+        for start in range(0, len(changed_posts), POSTS_PER_JOB):
+            jobs.append(("posts", changed_posts[start:start + POSTS_PER_JOB]))
+        return jobs, removed
+
+    def run_jobs(self, jobs):
+        if self.workers <= 1 or len(jobs) <= 1:
+            for kind, arg in jobs:
+                yield kind, arg, render_job(kind, arg)
+            return
+        executor = self._get_executor()
+        futures = {executor.submit(render_job, kind, arg): (kind, arg) for kind, arg in jobs}
+        for future in as_completed(futures):
+            kind, arg = futures[future]
+            yield kind, arg, future.result()
+
+    def build(self, full: bool = False):
+        """构建一次快照，返回生成、写入和删除的文件数"""
+        manifest = self.load_manifest()
+        db = SessionLocal()
+        try:
+            published = [post_id for post_id, in db.query(DBPost.id).filter(DBPost.status == "published").order_by(DBPost.id)]
+        finally:
+            db.close()
+        # 先读取版本号再生成文件，生成期间的修改会在下一次构建中处理
+        tags = ["posts"] + [tag for tag, _ in ENDPOINTS.values()] + [f"post:{post_id}" for post_id in published]
+        versions = self.current_versions(tags)
+        jobs, removed = self.plan(manifest, versions, published, full)
+
+        files = dict(manifest["files"])
+        stats = {"rendered": 0, "written": 0, "removed": 0}
+        stale = {post_path(post_id) for post_id in removed}
+        for kind, arg, output in self.run_jobs(jobs):
+            # 任务负责的旧文件中，本次没有生成的需要删除
+            if kind == "pages":
+                stale.update(path for path in files if path.startswith(PAGES_PREFIX) and path not in output)
+            elif kind == "endpoints":
+                for path in arg:
+                    if path not in output:
+                        # 生成失败的接口保留旧文件，不记录版本号，下次构建时重试
+                        versions.pop(ENDPOINTS[path][0], None)
+            elif kind == "posts":
+                for post_id in arg:
+                    if post_path(post_id) not in output:
+                        # 构建期间取消发布的文章
+                        stale.add(post_path(post_id))
+                        versions.pop(f"post:{post_id}", None)
+            for path, body in output.items():
+                stats["rendered"] += 1
+                digest = hashlib.sha1(body).hexdigest()
+                if files.get(path) == digest and (self.output_dir / path).exists():
+                    continue
+                self._write(path, body)
+                files[path] = digest
+                stats["written"] += 1
+        for path in stale:
+            self._remove(path)
+            if files.pop(path, None) is not None:
+                stats["removed"] += 1
+
+        self.save_manifest({"pageSize": self.page_size, "versions": versions, "files": files})
+        return stats
+
+    def watch(self, interval: float):
+        """定期检查标签版本号，有变化时增量构建"""
+        while True:
+            time.sleep(interval)
+            try:
+                stats = self.build()
+                if stats["written"] or stats["removed"]:
+                    print(f"快照已更新: 写入 {stats['written']} 个文件，删除 {stats['removed']} 个文件")
+            except Exception as e:
+                print(f"构建快照错误: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="导出公开接口的静态快照")
+    parser.add_argument("--output", default=os.getenv('SNAPSHOT_DIR', "snapshot"), help="输出目录")
+    parser.add_argument("--workers", type=int, default=int(os.getenv('SNAPSHOT_WORKERS', str(os.cpu_count() or 1))), help="并行进程数")
+    parser.add_argument("--page-size", type=int, default=int(os.getenv('SNAPSHOT_PAGE_SIZE', "10")), help="文章列表每页数量")
+    parser.add_argument("--full", action="store_true", help="忽略上次构建的记录，重新生成全部文件")
+    parser.add_argument("--watch", action="store_true", help="持续运行，数据变化时增量构建")
+    parser.add_argument("--interval", type=float, default=float(os.getenv('SNAPSHOT_INTERVAL', "10")), help="--watch 时检查变化的间隔（秒）")
+    args = parser.parse_args()
+
+    exporter = SnapshotExporter(args.output, args.workers, args.page_size)
+    try:
+        stats = exporter.build(full=args.full)
+        print(f"已生成 {stats['rendered']} 个文件，写入 {stats['written']} 个，删除 {stats['removed']} 个")
+        if args.watch:
+            exporter.watch(args.interval)
+    finally:
+        exporter.shutdown()
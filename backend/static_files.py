@@ -0,0 +1,154 @@
+import os
+import re
+from mimetypes import guess_type
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response, StreamingResponse
+from starlette.staticfiles import NotModifiedResponse
+from uploads import COMPRESSIBLE_EXTENSIONS, SIDECAR_ENCODINGS, sidecar_path
+from compression import accepted_encodings
+
+RANGE_CHUNK_SIZE = 64 * 1024
+# 按内容哈希（或旧版本的 uuid）命名的文件，内容不会改变
+IMMUTABLE_NAME = re.compile(r"^(?:[0-9a-f]{64}|[0-9a-f]{8}(?:-[0-9a-f]{4}){3}-[0-9a-f]{12})\.")
+
+
+class RangeNotSatisfiable(Exception):
+    """请求的字节范围超出文件大小"""
+
+
+def parse_range(header: str, size: int):
+    """解析单段字节范围，返回 (start, end)
+
+    多段范围或无法解析时返回 None（返回完整文件），超出文件大小时抛出 RangeNotSatisfiable。
+    """
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start, sep, end = ranges.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if not start:
+            # bytes=-500 表示最后 500 字节
+            length = int(end)
+            if length <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start > end:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
+
+
+def iter_file_range(path, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+class UploadStaticFiles(StaticFiles):
+    """上传文件的静态服务
+
+    - 按内容哈希命名的文件返回 immutable 的长期缓存头，其他文件（如重命名过的）每次协商
+    - 客户端接受时返回上传时生成的 brotli / gzip 预压缩版本
+    - 支持单段 Range 请求和 If-Range
+    - If-None-Match / If-Modified-Since 由 StaticFiles 处理
+    """
+
+    def __init__(self, *args, upload_dir, max_age: int = 31536000, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upload_dir = upload_dir
+        self.max_age = max_age
+
+    def cache_control(self, full_path):
+        if IMMUTABLE_NAME.match(os.path.basename(full_path)):
+            return f"public, max-age={self.max_age}, immutable"
+        return "no-cache"
+
+    def select_sidecar(self, full_path, request_headers: Headers):
+        """返回 (编码, 压缩文件路径, stat)，没有可用的压缩版本时返回 None"""
+        filename = os.path.basename(full_path)
+        if os.path.dirname(os.path.abspath(full_path)) != os.path.abspath(self.upload_dir):
+            return None
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        for encoding in SIDECAR_ENCODINGS:
+            if encoding not in accepted:
+                continue
+            path = sidecar_path(self.upload_dir, filename, encoding)
+            try:
+                return encoding, path, os.stat(path)
+            except OSError:
+                continue
+        return None
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200):
+        request_headers = Headers(scope=scope)
+        compressible = os.path.splitext(full_path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+        headers = {"Cache-Control": self.cache_control(full_path)}
+        if compressible:
+            headers["Vary"] = "Accept-Encoding"
+
+        range_header = request_headers.get("range")
+        sidecar = None
+        if status_code == 200 and compressible and not range_header:
+            sidecar = self.select_sidecar(full_path, request_headers)
+        if sidecar is not None:
+            encoding, path, sidecar_stat = sidecar
+            headers["Content-Encoding"] = encoding
+            response = FileResponse(
+                path,
+                status_code=status_code,
+                headers=headers,
+                media_type=guess_type(str(full_path))[0] or "application/octet-stream",
+                stat_result=sidecar_stat
+            )
+        else:
+            headers["Accept-Ranges"] = "bytes"
+            response = FileResponse(full_path, status_code=status_code, headers=headers, stat_result=stat_result)
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        if sidecar is None and range_header and status_code == 200 and scope["method"] == "GET":
+            return self.range_response(full_path, stat_result, request_headers, response)
+        return response
+
+    def range_response(self, full_path, stat_result, request_headers: Headers, full_response: FileResponse):
+        size = stat_result.st_size
+        if size == 0:
+            return full_response
+        if_range = request_headers.get("if-range")
+        if if_range and if_range not in (full_response.headers.get("etag"), full_response.headers.get("last-modified")):
+            # 文件已变化，返回完整内容
+            return full_response
+        try:
+            byte_range = parse_range(request_headers["range"], size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+        if byte_range is None:
+            return full_response
+
+        start, end = byte_range
+        headers = {
+            name: value for name, value in full_response.headers.items()
+            if name in ("cache-control", "etag", "last-modified", "accept-ranges", "vary")
+        }
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            iter_file_range(full_path, start, end),
+            status_code=206,
+            headers=headers,
+            media_type=full_response.media_type
+        )
@@ -0,0 +1,67 @@
+import re
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+
+class RequestBodyTooLarge(Exception):
+    pass
+
+
+class UploadSizeLimitMiddleware:
+    """限制上传接口的请求体大小，超出 max_body_size 时立即返回 413
+
+    只处理路径匹配 path_pattern 的 POST 请求。Content-Length 超出限制时不读取请求体；
+    没有 Content-Length（分块传输）或实际内容比声明的长时，边接收边计数，超出后停止接收，
+    不会等 Starlette 把整个表单接收并写入临时文件。
+    """
+
+    def __init__(self, app, max_body_size: int, path_pattern: str):
+        self.app = app
+        self.max_body_size = max_body_size
+        self.path_pattern = re.compile(path_pattern)
+
+    def reject(self):
+        return JSONResponse(content={"detail": "文件过大"}, status_code=413)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not self.path_pattern.fullmatch(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body_size:
+            await self.reject()(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                raise RequestBodyTooLarge()
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    exceeded = True
+                    raise RequestBodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal response_started
+            # 超出限制后，路由把解析表单的异常转换成的错误响应（如 400）不发送，改为返回 413
+            if exceeded:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            # 超出限制引起的异常（可能被路由包装成其他异常）统一返回 413
+            if not exceeded:
+                raise
+        if exceeded and not response_started:
+            await self.reject()(scope, receive, send)
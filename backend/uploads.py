@@ -0,0 +1,212 @@
+import os
+import gzip
+import hashlib
+import tempfile
+from pathlib import Path
+from datetime import datetime
+from collections import namedtuple
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from database import MediaFile
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli 时只生成 gzip 版本
+    brotli = None
+
+CHUNK_SIZE = 1024 * 1024
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".svg"]
+DOCUMENT_EXTENSIONS = [".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx", ".txt", ".md"]
+# 预压缩的文件类型，压缩版本保存在 upload_dir/compressed 下
+COMPRESSIBLE_EXTENSIONS = [".svg", ".txt", ".md", ".pdf"]
+SIDECAR_ENCODINGS = {"br": ".br", "gzip": ".gz"}
+# 压缩后至少要比原文件小 10% 才保留
+SIDECAR_MIN_RATIO = 0.9
+
+# mkstemp 创建的临时文件权限为 0600，保存前改为普通新建文件的权限（按进程的 umask），
+# 否则以其他用户运行的 nginx 等无法直接读取上传文件；umask 只能通过设置来读取，在导入时读取一次
+_umask = os.umask(0)
+os.umask(_umask)
+UPLOAD_FILE_MODE = 0o666 & ~_umask
+
+StoredUpload = namedtuple("StoredUpload", ["filename", "size", "content_hash"])
+
+
+class UploadTooLarge(Exception):
+    """上传文件超过大小限制"""
+
+
+class UploadTypeNotAllowed(Exception):
+    """上传文件类型不在允许列表中"""
+
+
+def store_upload(fileobj, filename: str, upload_dir: Path, max_size: int, allowed_extensions):
+    """分块写入上传文件并计算 SHA-256，按内容哈希命名保存，返回 StoredUpload
+
+    文件先写入 upload_dir/.tmp 下的临时文件，超过 max_size 时立即停止读取。
+    内容相同的文件只保存一份。
+    """
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension not in allowed_extensions:
+        raise UploadTypeNotAllowed(extension)
+
+    tmp_dir = upload_dir / ".tmp"
+    tmp_dir.mkdir(exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        digest = hashlib.sha256()
+        size = 0
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = fileobj.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(size)
+                digest.update(chunk)
+                out.write(chunk)
+
+        content_hash = digest.hexdigest()
+        stored_name = f"{content_hash}{extension}"
+        target = upload_dir / stored_name
+        if target.exists():
+            # 相同内容已存在，直接复用
+            os.remove(tmp_path)
+        else:
+            os.chmod(tmp_path, UPLOAD_FILE_MODE)
+            os.replace(tmp_path, target)
+        return StoredUpload(stored_name, size, content_hash)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def mime_class(filename: str):
+    suffix = os.path.splitext(filename)[1].lower()
+    if suffix in IMAGE_EXTENSIONS:
+        return "image"
+    if suffix in DOCUMENT_EXTENSIONS:
+        return "document"
+    return "other"
+
+
+def file_mtime(path):
+    # 数据库 TIMESTAMP 精确到秒
+    return datetime.fromtimestamp(os.stat(path).st_mtime).replace(microsecond=0)
+
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compressed_dir(upload_dir: Path):
+    return upload_dir / "compressed"
+
+
+def sidecar_path(upload_dir: Path, filename: str, encoding: str):
+    return compressed_dir(upload_dir) / f"{filename}{SIDECAR_ENCODINGS[encoding]}"
+
+
+def write_compressed_sidecars(upload_dir: Path, filename: str):
+    """为可压缩的文件生成 gzip / brotli 版本，压缩效果不明显时不保存"""
+    if os.path.splitext(filename)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+        return
+    with open(upload_dir / filename, "rb") as f:
+        data = f.read()
+    compressors = {"gzip": lambda raw: gzip.compress(raw, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        compressors["br"] = lambda raw: brotli.compress(raw, quality=11)
+
+    compressed_dir(upload_dir).mkdir(exist_ok=True)
+    for encoding, compress in compressors.items():
+        target = sidecar_path(upload_dir, filename, encoding)
+        compressed = compress(data)
+        if len(compressed) > len(data) * SIDECAR_MIN_RATIO:
+            target.unlink(missing_ok=True)
+            continue
+        tmp_path = target.with_name(f".{target.name}.tmp")
+        with open(tmp_path, "wb") as out:
+            out.write(compressed)
+        os.replace(tmp_path, target)
+
+
+def remove_compressed_sidecars(upload_dir: Path, filename: str):
+    for encoding in SIDECAR_ENCODINGS:
+        sidecar_path(upload_dir, filename, encoding).unlink(missing_ok=True)
+
+
+def rename_compressed_sidecars(upload_dir: Path, oldname: str, newname: str):
+    for encoding in SIDECAR_ENCODINGS:
+        old_path = sidecar_path(upload_dir, oldname, encoding)
+        if old_path.exists():
+            os.replace(old_path, sidecar_path(upload_dir, newname, encoding))
+
+
+def index_upload(db, upload_dir: Path, filename: str, size: int, content_hash: str, mtime: datetime = None):
+    """新增或更新上传文件索引，mtime 为空时读取文件的修改时间
+
+    用一条 INSERT ... ON DUPLICATE KEY UPDATE 写入：同时上传相同内容的两个请求写入同一个文件名，
+    先查询再插入（db.merge）时后一个请求会违反主键约束。
+    """
+    values = {
+        "size": size,
+        "mtime": mtime or file_mtime(upload_dir / filename),
+        "mime_class": mime_class(filename),
+        "content_hash": content_hash
+    }
+    db.execute(mysql_insert(MediaFile).values(filename=filename, **values).on_duplicate_key_update(**values))
+
+
+def reconcile_upload_index(db, upload_dir: Path, batch_size: int = 500):
+    """用 os.scandir 重新扫描上传目录，同步文件索引
+
+    大小和修改时间都没变的文件不会重新计算哈希。新增或变化的文件同时重新生成压缩版本。
+    """
+    indexed = {filename: (size, mtime) for filename, size, mtime in db.query(MediaFile.filename, MediaFile.size, MediaFile.mtime)}
+    seen = set()
+    added = updated = 0
+    pending = 0
+    with os.scandir(upload_dir) as entries:
+        for entry in entries:
+            if entry.name.startswith(".") or not entry.is_file():
+                continue
+            seen.add(entry.name)
+            stat = entry.stat()
+            mtime = datetime.fromtimestamp(stat.st_mtime).replace(microsecond=0)
+            current = indexed.get(entry.name)
+            if current == (stat.st_size, mtime):
+                continue
+            content_hash = hash_file(entry.path)
+            write_compressed_sidecars(upload_dir, entry.name)
+            # 扫描期间上传接口可能已经为同一个文件写入索引，与上传接口一样用 upsert 写入
+            index_upload(db, upload_dir, entry.name, stat.st_size, content_hash, mtime)
+            if current is None:
+                added += 1
+            else:
+                updated += 1
+            pending += 1
+            if pending >= batch_size:
+                db.commit()
+                pending = 0
+
+    removed = [name for name in indexed if name not in seen]
+    for name in removed:
+        remove_compressed_sidecars(upload_dir, name)
+    for start in range(0, len(removed), batch_size):
+        db.query(MediaFile).filter(MediaFile.filename.in_(removed[start:start + batch_size])).delete(synchronize_session=False)
+    db.commit()
+    return {"added": added, "updated": updated, "removed": len(removed)}
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+    session = SessionLocal()
+    try:
+        print(reconcile_upload_index(session, Path("uploads")))
+    finally:
+        session.close()
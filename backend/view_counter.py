@@ -0,0 +1,99 @@
+import sqlite3
+import threading
+from collections import defaultdict
+from sqlalchemy import text, bindparam
+
+# updated_at = updated_at 阻止 MySQL 的 ON UPDATE CURRENT_TIMESTAMP，阅读量不算内容修改
+FLUSH_STATEMENT = text(
+    "UPDATE posts SET views = views + :n, updated_at = updated_at WHERE id IN :ids"
+).bindparams(bindparam("ids", expanding=True))
+
+UPSERT_STATEMENT = (
+    "INSERT INTO pending_views (post_id, n) VALUES (?, ?) "
+    "ON CONFLICT(post_id) DO UPDATE SET n = n + excluded.n"
+)
+# RETURNING 需要 SQLite 3.35 及以上
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+class ViewCounter:
+    """阅读量写回缓冲
+
+    阅读请求只在本地 SQLite 文件中累加增量，由后台任务定期合并成
+    UPDATE posts SET views = views + n 批量写入 MySQL。SQLite 文件在同一台
+    机器的多个 worker 之间共享，BEGIN IMMEDIATE 保证同一批增量只会被一个
+    worker 取走。增量可以丢失少量（断电时最近的提交），因此使用 synchronous=NORMAL，
+    WAL 模式下提交时不再等待 fsync。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS pending_views ("
+            "post_id TEXT PRIMARY KEY, "
+            "n INTEGER NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            # synchronous 是连接级设置，每个连接都需要设置
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def incr(self, post_id: str, n: int = 1):
+        """累加阅读量，返回该文章尚未写入数据库的增量"""
+        conn = self._conn()
+        if not SUPPORTS_RETURNING:
+            conn.execute(UPSERT_STATEMENT, (post_id, n))
+            return self.pending(post_id)
+        # 一条语句完成累加和读取，只提交一次
+        return conn.execute(UPSERT_STATEMENT + " RETURNING n", (post_id, n)).fetchone()[0]
+
+    def pending(self, post_id: str):
+        row = self._conn().execute("SELECT n FROM pending_views WHERE post_id = ?", (post_id,)).fetchone()
+        return row[0] if row else 0
+
+    def _claim(self):
+        """原子地取出并清空所有待写入的增量"""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("SELECT post_id, n FROM pending_views").fetchall()
+            conn.execute("DELETE FROM pending_views")
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def flush(self, session_factory):
+        """将累积的阅读量批量写入数据库，返回写入的文章ID列表"""
+        rows = self._claim()
+        if not rows:
+            return []
+
+        # 按增量分组，相同增量的文章合并为一条 UPDATE
+        by_increment = defaultdict(list)
+        for post_id, n in rows:
+            by_increment[n].append(post_id)
+
+        db = session_factory()
+        try:
+            for n, post_ids in by_increment.items():
+                db.execute(FLUSH_STATEMENT, {"n": n, "ids": post_ids})
+            db.commit()
+        except Exception:
+            db.rollback()
+            # 写入失败时把增量放回缓冲，等待下次重试
+            for post_id, n in rows:
+                self.incr(post_id, n)
+            raise
+        finally:
+            db.close()
+        return [post_id for post_id, _ in rows]